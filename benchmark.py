@@ -0,0 +1,548 @@
+"""Benchmarks for the expense tracker.
+
+    python benchmark.py suite [--sizes 10000 100000 1000000] [--engine pickle|sqlite] [--output results.json]
+    python benchmark.py startup [--sizes 10000 100000 1000000] [--engine pickle|sqlite] [--output results.json]
+    python benchmark.py server [--sizes 100000] [--rate 500] [--duration 10] [--connections 16]
+    python benchmark.py stress [--processes 8] [--operations 300] [--compact-size BYTES]
+    python benchmark.py memory [--rows N]
+
+The suite times the tracker's hot paths on synthetic histories of each size and records wall time
+and peak traced memory per operation. startup times importing main and reaching the first menu in
+a fresh interpreter, and then the first call that needs the expenses. server serves each history
+over the HTTP API and drives it with a fixed rate of mixed reads and adds, recording throughput,
+latency percentiles and errors per request kind. stress runs several processes changing the same
+data files at once and checks that no change was lost. Results are JSON so runs on
+different commits can be diffed.
+"""
+import argparse
+import collections
+import contextlib
+import functools
+import gc
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+import main
+from main import Expense
+
+DESCRIPTIONS = ["Groceries", "Metro", "Coffee", "Rent", "Electricity bill", "Lunch", "Fuel", "Movie tickets"]
+# Whole words, a prefix, a typo and two words, as search_expenses takes them
+SEARCHES = ["groceries", "elec", "moive", "coffee 12"]
+# Category rules for the categorize op: many keywords, as a user with a long merchant list would have, and a few expressions
+RULE_KEYWORDS = 500
+CATEGORIZE_ROWS = 10000
+DEFAULT_SIZES = (10000, 100000, 1000000)
+EXPENSES_PER_DAY = 8
+REPEAT = 100  # add_expense and remove_expense are timed over this many calls
+STARTUP_RUNS = 5  # fresh interpreters per size; the fastest is kept
+# Imports that startup should not need; the startup benchmark reports which of them were loaded
+HEAVY_MODULES = ("openpyxl", "sqlite3", "concurrent.futures", "csv", "cProfile")
+
+
+@dataclass
+class PlainExpense:
+    """Expense as it was before slots and interning, for comparison"""
+    amount: float
+    description: str
+    category: int
+    payment_method: int
+    date: float
+
+
+def _rows(n, seed=1):
+    rng = random.Random(seed)
+    for i in range(n):
+        # Built fresh each time, as descriptions are when read back from a file
+        description = "".join(list(rng.choice(DESCRIPTIONS)))
+        yield round(rng.uniform(1, 2000), 2), description, rng.randrange(11), rng.randrange(3), 1.6e9 + i * 600.0
+
+
+def _measure(cls, n):
+    """Bytes allocated to hold n records of cls, descriptions included"""
+    gc.collect()
+    tracemalloc.start()
+    records = [cls(*row) for row in _rows(n)]
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del records
+    return used
+
+
+def bench_memory(n):
+    plain = _measure(PlainExpense, n)
+    slotted = _measure(Expense, n)
+    print(f"{n} records")
+    print(f"  plain dataclass:          {plain / n:7.1f} bytes/record")
+    print(f"  slots + interned strings: {slotted / n:7.1f} bytes/record")
+    print(f"  {plain / slotted:.2f}x less memory")
+    return {'rows': n, 'plain_bytes_per_record': plain / n, 'slotted_bytes_per_record': slotted / n}
+
+
+# --- Suite ---
+
+def synthetic_expenses(n, seed=0):
+    """n expenses ending today, about EXPENSES_PER_DAY a day, with skewed categories and amounts.
+    Each is dated at local midnight, as the tracker dates expenses it is given."""
+    rng = random.Random(seed)
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    days = [(today - timedelta(days=d)).timestamp() for d in range(max(1, n // EXPENSES_PER_DAY))]
+    dates = sorted(rng.choice(days) for _ in range(n))
+    return [
+        Expense(round(rng.lognormvariate(5, 1), 2), f"{rng.choice(DESCRIPTIONS)} {rng.randrange(50)}",
+                min(int(rng.expovariate(0.4)), 10), rng.choice((0, 1, 1, 2)), date)
+        for date in dates
+    ]
+
+
+def _open_tracker(engine):
+    tracker = main.ExpenseTracker(storage=engine)
+    tracker.init_tracker()
+    return tracker
+
+
+def _run(op, traced):
+    """(seconds, peak traced bytes or None) for one call of op"""
+    gc.collect()
+    if traced:
+        tracemalloc.start()
+    start = time.perf_counter()
+    op()
+    seconds = time.perf_counter() - start
+    peak = None
+    if traced:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return seconds, peak
+
+
+def _build_history(n, engine, workdir):
+    """A tracker over a new n-expense history saved in its own directory under workdir"""
+    main.set_data_dir(os.path.join(workdir, f"{engine}-{n}"))
+    with contextlib.redirect_stdout(io.StringIO()):
+        tracker = _open_tracker(engine)
+        tracker._add_many(synthetic_expenses(n))
+        tracker.flush()
+    return tracker
+
+
+def bench_size(n, engine, workdir):
+    """Build an n-expense history in workdir and time each operation on it"""
+    tracker = _build_history(n, engine, workdir)
+    tracker._export_dir = lambda: workdir
+    now = datetime.now()
+    newest = datetime.fromtimestamp(tracker.newest_expenses(1)[0].date)
+    year_ago = newest - timedelta(days=365)
+    rng = random.Random(n)
+
+    def add_many():
+        for _ in range(REPEAT):
+            tracker.add_expense(round(rng.uniform(1, 500), 2), "Benchmark", rng.randrange(11), rng.randrange(3),
+                                now.timestamp() - rng.uniform(0, 86400 * 365))
+
+    def remove_many():
+        for _ in range(REPEAT):
+            tracker.remove_expense(tracker.listed_expense(rng.randint(1, 50)))
+
+    def cold(report):
+        # Reports are cached until the data changes; time them as the first call after a change
+        def op():
+            tracker._reports.clear()
+            report()
+        return op
+
+    def search_cold():
+        # The index is built by the first search and then kept up to date
+        tracker._search = None
+        tracker.search_expenses("rent")
+
+    def search_many():
+        for text in SEARCHES:
+            tracker.search_expenses(text)
+        tracker.search_expenses("bill", category=2, min_amount=100, start_date=year_ago, end_date=newest)
+
+    tracker.category_rules = [main.categorize.Rule(f"merchant{i}", tracker.category_names[i % 11]) for i in range(RULE_KEYWORDS)]
+    tracker.category_rules += [main.categorize.Rule(r"\bemi\s+\d+", "Banking", True), main.categorize.Rule(r"rent|lease", "Housing", True)]
+    to_categorize = [f"{rng.choice(DESCRIPTIONS)} merchant{rng.randrange(2 * RULE_KEYWORDS)} {i}" for i in range(CATEGORIZE_ROWS)]
+
+    def categorize_many():
+        # As import_statement does for rows without a category: one matcher for the whole batch
+        guess = tracker._auto_categorizer().categorize
+        for description in to_categorize:
+            guess(description)
+
+    ops = [
+        ("init_tracker", lambda: _open_tracker(engine), 1),
+        # init_tracker defers the expense lists; this is startup plus the first call that needs them
+        ("init_tracker_and_load", lambda: _open_tracker(engine).expense_count(), 1),
+        ("add_expense", add_many, REPEAT),
+        ("list_expenses", tracker.list_expenses, 1),
+        ("category_summary", cold(tracker.category_summary), 1),
+        ("category_summary_cached", tracker.category_summary, 1),
+        ("recurring_expenses", cold(tracker.recurring_expenses), 1),
+        # With the month-end forecast, which detects the recurring expenses again
+        ("budget_alert", cold(lambda: tracker.budget_alert(50000)), 1),
+        ("export_to_excel_date_range", lambda: tracker.export_to_excel_date_range(year_ago, newest), 1),
+        ("search_first", search_cold, 1),
+        ("search", search_many, len(SEARCHES) + 1),
+        ("categorize", categorize_many, CATEGORIZE_ROWS),
+        ("remove_expense", remove_many, REPEAT),
+    ]
+    results = []
+    for name, op, calls in ops:
+        with contextlib.redirect_stdout(io.StringIO()):
+            seconds, _ = _run(op, traced=False)
+            _, peak = _run(op, traced=True)
+        results.append({'size': n, 'op': name, 'calls': calls, 'seconds': seconds,
+                        'seconds_per_call': seconds / calls, 'peak_bytes': peak})
+        print(f"  {n:>9} {name:<28} {seconds / calls * 1000:>10.3f} ms/call {peak / 1024:>10.0f} KiB peak", file=sys.stderr)
+    tracker.flush()
+    if tracker._db is not None:
+        tracker._db.close()
+    return results
+
+
+# --- Startup ---
+
+# Runs in a fresh interpreter so that imports are timed cold: argv is the data directory, the engine
+# and the JSON list of modules to look for once the first menu could be shown
+STARTUP_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+main.set_data_dir(sys.argv[1])
+tracker = main.ExpenseTracker(storage=sys.argv[2])
+tracker.init_tracker()
+ready = time.perf_counter()
+heavy = [m for m in json.loads(sys.argv[3]) if m in sys.modules]
+tracker.expense_count()
+print(json.dumps({'import': imported - start, 'first_menu': ready - start,
+                  'first_use': time.perf_counter() - ready, 'heavy_modules': heavy}))
+"""
+
+
+def bench_startup(n, engine, workdir):
+    tracker = _build_history(n, engine, workdir)
+    data_dir = os.path.dirname(main.CURRENT_FILE)
+    if tracker._db is not None:
+        tracker._db.close()
+    runs = []
+    for _ in range(STARTUP_RUNS):
+        out = subprocess.run([sys.executable, "-c", STARTUP_PROBE, data_dir, engine, json.dumps(HEAVY_MODULES)],
+                             cwd=main.SCRIPT_DIR, capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(out.strip().splitlines()[-1]))
+    best = min(runs, key=lambda r: r['first_menu'])
+    print(f"  {n:>9} import {best['import'] * 1000:8.1f} ms  first menu {best['first_menu'] * 1000:8.1f} ms  "
+          f"first use {best['first_use'] * 1000:9.1f} ms  heavy: {', '.join(best['heavy_modules']) or 'none'}",
+          file=sys.stderr)
+    return [{'size': n, 'import_seconds': best['import'], 'first_menu_seconds': best['first_menu'],
+             'first_use_seconds': best['first_use'], 'heavy_modules': best['heavy_modules']}]
+
+
+# --- Server ---
+
+# Share of each request kind in the server load test; the rest of a request is picked at random
+LOAD_MIX = (("list", 60), ("month_report", 20), ("range_report", 10), ("add", 10))
+
+
+def _load_request(kind, rng, today):
+    """(method, path, body) for one request of kind"""
+    if kind == "list":
+        return "GET", f"/expenses?page={rng.randint(1, 20)}", None
+    if kind == "month_report":
+        day = today - timedelta(days=rng.randrange(365))
+        return "GET", f"/reports/month?month={day.month:02d}-{day.year}&budget=50000", None
+    if kind == "range_report":
+        start = today - timedelta(days=rng.randrange(30, 365))
+        return "GET", f"/reports/range?start={start:%d-%m-%Y}&end={today:%d-%m-%Y}", None
+    return "POST", "/expenses", {'amount': round(rng.uniform(1, 500), 2), 'description': "Load test",
+                                 'category': rng.randrange(11), 'payment_method': rng.randrange(3),
+                                 'date': (today - timedelta(days=rng.randrange(365))).strftime('%d-%m-%Y')}
+
+
+async def _load_client(host, port, requests, latencies, errors):
+    """Send requests ((due, kind, method, path, body), due in perf_counter seconds) over one
+    keep-alive connection. Latency runs from when a request was due, not when it was sent, so
+    time spent waiting behind a slow response counts against the server."""
+    import asyncio
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for due, kind, method, path, body in requests:
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            data = json.dumps(body).encode('utf-8') if body is not None else b''
+            writer.write(f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Length: {len(data)}\r\n\r\n".encode('latin-1') + data)
+            await writer.drain()
+            status = int((await reader.readline()).split()[1])
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                if name.lower() == "content-length":
+                    length = int(value)
+            await reader.readexactly(length)
+            latencies.setdefault(kind, []).append(time.perf_counter() - due)
+            if status >= 400:
+                errors[kind] = errors.get(kind, 0) + 1
+    finally:
+        writer.close()
+
+
+def _start_server(n, engine, workdir):
+    """Serve a new n-expense history on an ephemeral port from a background thread; returns
+    (port, stop). The tracker is built on that thread, which SQLite connections require."""
+    import asyncio
+    import threading
+    import server
+    started = {}
+    ready = threading.Event()
+
+    def run():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        tracker = _build_history(n, engine, workdir)
+        tracker.expense_count()
+        api = server.ApiServer(tracker)
+        listener = loop.run_until_complete(api.start("127.0.0.1", 0))
+        started.update(port=listener.sockets[0].getsockname()[1], loop=loop)
+        ready.set()
+        loop.run_forever()
+        listener.close()
+        # The clients have hung up, so connections end on their own; only the writer waits forever
+        api._writer_task.cancel()
+        loop.run_until_complete(asyncio.wait(asyncio.all_tasks(loop), timeout=1))
+        loop.close()
+        api.close()
+        with contextlib.redirect_stdout(io.StringIO()):
+            tracker.flush()
+        if tracker._db is not None:
+            tracker._db.close()
+
+    thread = threading.Thread(target=run, name="benchmark-server", daemon=True)
+    thread.start()
+    ready.wait()
+
+    def stop():
+        started['loop'].call_soon_threadsafe(started['loop'].stop)
+        thread.join()
+    return started['port'], stop
+
+
+def _percentiles(seconds):
+    seconds = sorted(seconds)
+    pick = lambda p: seconds[min(len(seconds) - 1, int(p / 100 * len(seconds)))] * 1000
+    return {'p50_ms': pick(50), 'p90_ms': pick(90), 'p99_ms': pick(99), 'max_ms': seconds[-1] * 1000}
+
+
+def bench_server(n, engine, workdir, rate=500, duration=10.0, connections=16):
+    """Serve an n-expense history and drive it at `rate` requests a second of the LOAD_MIX for
+    `duration` seconds, spread over keep-alive connections; reports throughput and latency per kind"""
+    import asyncio
+    port, stop = _start_server(n, engine, workdir)
+    rng = random.Random(n)
+    today = datetime.now()
+    kinds = [kind for kind, share in LOAD_MIX for _ in range(share)]
+    total = int(rate * duration)
+    latencies, errors = {}, {}
+
+    async def drive():
+        start = time.perf_counter() + 0.1
+        lanes = [[] for _ in range(connections)]
+        for i in range(total):
+            kind = rng.choice(kinds)
+            lanes[i % connections].append((start + i / rate, kind) + _load_request(kind, rng, today))
+        await asyncio.gather(*(_load_client("127.0.0.1", port, lane, latencies, errors) for lane in lanes))
+        return time.perf_counter() - start
+
+    try:
+        elapsed = asyncio.run(drive())
+    finally:
+        stop()
+    results = []
+    for kind in sorted(latencies) + ["all"]:
+        seconds = [s for k in latencies for s in latencies[k]] if kind == "all" else latencies[kind]
+        failed = sum(errors.values()) if kind == "all" else errors.get(kind, 0)
+        result = {'size': n, 'op': kind, 'requests': len(seconds), 'errors': failed,
+                  'requests_per_second': len(seconds) / elapsed}
+        result.update(_percentiles(seconds))
+        results.append(result)
+        print(f"  {n:>9} {kind:<14} {len(seconds):>7} req {result['requests_per_second']:>8.1f}/s "
+              f"p50 {result['p50_ms']:8.2f} ms  p99 {result['p99_ms']:8.2f} ms  errors {failed}", file=sys.stderr)
+    return results
+
+
+# --- Multi-process stress ---
+
+# One of several processes changing the same data files at once: argv is the data directory, the
+# worker number, the number of operations, the wall-clock time to start at and the journal size
+# that triggers a compaction. Prints the keys of the expenses it expects to survive and the
+# balances it recorded.
+STRESS_WORKER = """
+import json, random, sys, time
+import main
+data_dir, worker, operations, start_at, compact_size = sys.argv[1:6]
+worker, operations = int(worker), int(operations)
+main.set_data_dir(data_dir)
+main.JOURNAL_COMPACT_SIZE = int(compact_size)
+tracker = main.ExpenseTracker(storage="pickle")
+tracker.init_tracker()
+rng = random.Random(worker)
+mine, balances = [], []
+time.sleep(max(0.0, float(start_at) - time.time()))
+for i in range(operations):
+    roll = rng.random()
+    if roll < 0.15 and mine:
+        key = mine.pop(rng.randrange(len(mine)))
+        assert tracker._remove(main.Expense(*key)), key
+    elif roll < 0.3 and mine:
+        j = rng.randrange(len(mine))
+        old = tracker.find_expense(mine[j])
+        new = old.copy()
+        new.amount = round(new.amount + 1, 2)
+        assert tracker._replace(old, new), mine[j]
+        mine[j] = main.expense_key(new)
+    elif roll < 0.32:
+        amount = worker * 1e6 + i
+        tracker.set_balance(worker % 2 == 0, amount)
+        balances.append(amount)
+    else:
+        e = main.Expense(rng.randint(100, 10**6) / 100, f"worker {worker} #{i}", rng.randrange(11), rng.randrange(3),
+                         1.7e9 + rng.randrange(10**7))
+        tracker._add(e)
+        mine.append(main.expense_key(e))
+tracker.flush()
+print(json.dumps({'expected': mine, 'balances': balances}))
+"""
+
+
+def bench_stress(processes, operations, compact_size):
+    """Run `processes` workers changing one set of data files at once, then check from a fresh
+    tracker that every change survived: each worker's expenses are all there and nothing else is,
+    every balance recorded is in the history, and journal sequence numbers run on without gaps"""
+    with tempfile.TemporaryDirectory() as workdir:
+        main.set_data_dir(workdir)
+        start_at = time.time() + 1.0  # time for every interpreter to start before any begins
+        workers = [subprocess.Popen([sys.executable, "-c", STRESS_WORKER, workdir, str(w), str(operations), str(start_at),
+                                     str(compact_size)], cwd=main.SCRIPT_DIR, stdout=subprocess.PIPE,
+                                    stderr=subprocess.PIPE, text=True)
+                   for w in range(processes)]
+        outputs = [w.communicate() for w in workers]
+        elapsed = time.time() - start_at
+        failed = [err.strip().splitlines()[-1] for (out, err), w in zip(outputs, workers) if w.returncode]
+        if failed:
+            raise RuntimeError(f"{len(failed)} worker(s) failed: {failed[0]}")
+        results = [json.loads(out.strip().splitlines()[-1]) for out, _ in outputs]
+
+        tracker = main.ExpenseTracker(storage="pickle")
+        tracker.init_tracker()
+        found = collections.Counter(main.expense_key(e) for e in tracker.all_expenses())
+        expected = collections.Counter(tuple(key) for r in results for key in r['expected'])
+        tracker.load_balance()
+        history = {h.amount for h in tracker.bank_history + tracker.cash_history}
+        missing_balances = [b for r in results for b in r['balances'] if b not in history]
+        seqs = []
+        if os.path.exists(main.JOURNAL_FILE):
+            with open(main.JOURNAL_FILE, 'rb') as f:
+                seqs = [json.loads(line)['seq'] for line in f]
+        gaps = sum(1 for a, b in zip(seqs, seqs[1:]) if b != a + 1)
+    lost, unexpected = expected - found, found - expected
+    report = {
+        'meta': _meta("pickle"),
+        'processes': processes, 'operations_per_process': operations, 'compact_size': compact_size,
+        'seconds': elapsed, 'operations_per_second': processes * operations / elapsed,
+        'expenses': sum(found.values()), 'lost_expenses': sum(lost.values()),
+        'unexpected_expenses': sum(unexpected.values()), 'missing_balances': len(missing_balances),
+        'journal_sequence_gaps': gaps,
+    }
+    report['ok'] = not (lost or unexpected or missing_balances or gaps)
+    print(f"  {processes} processes x {operations} operations in {elapsed:.2f} s "
+          f"({report['operations_per_second']:.0f}/s): {report['lost_expenses']} lost, "
+          f"{report['unexpected_expenses']} unexpected, {len(missing_balances)} balances missing, "
+          f"{gaps} sequence gaps -> {'OK' if report['ok'] else 'FAILED'}", file=sys.stderr)
+    return report
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=main.SCRIPT_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _meta(engine):
+    return {'commit': _commit(), 'engine': engine, 'python': platform.python_version(),
+            'platform': platform.platform(), 'time': datetime.now().isoformat(timespec='seconds')}
+
+
+def bench_suite(sizes, engine, bench=bench_size):
+    report = {'meta': _meta(engine), 'results': []}
+    with tempfile.TemporaryDirectory() as workdir:
+        for n in sizes:
+            report['results'] += bench(n, engine, workdir)
+    return report
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", metavar="command")
+    suite = commands.add_parser("suite", help="time the tracker's hot paths at several history sizes")
+    startup = commands.add_parser("startup", help="import time and time to the first menu at several history sizes")
+    server = commands.add_parser("server", help="throughput and latency of the HTTP API under a mixed load")
+    for command in (suite, startup, server):
+        command.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+        command.add_argument("--engine", choices=("pickle", "sqlite"), default="pickle")
+        command.add_argument("--output", help="write the JSON results here instead of to stdout")
+    server.add_argument("--rate", type=float, default=500, help="requests per second to send")
+    server.add_argument("--duration", type=float, default=10, help="seconds to keep sending")
+    server.add_argument("--connections", type=int, default=16, help="keep-alive connections to spread them over")
+    stress = commands.add_parser("stress", help="many processes changing the same data files at once")
+    stress.add_argument("--processes", type=int, default=8)
+    stress.add_argument("--operations", type=int, default=300, help="changes per process")
+    stress.add_argument("--compact-size", type=int, default=16 * 1024,
+                        help="journal bytes that trigger a compaction (small, to exercise reloads)")
+    stress.add_argument("--output", help="write the JSON results here instead of to stdout")
+    memory = commands.add_parser("memory", help="per-record memory of Expense objects")
+    memory.add_argument("--rows", type=int, default=100000)
+    args = parser.parse_args()
+    if args.command in ("suite", "startup", "server"):
+        if args.command == "server":
+            bench = functools.partial(bench_server, rate=args.rate, duration=args.duration, connections=args.connections)
+        else:
+            bench = bench_size if args.command == "suite" else bench_startup
+        report = bench_suite(args.sizes, args.engine, bench)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+        else:
+            print(json.dumps(report, indent=2))
+    elif args.command == "stress":
+        report = bench_stress(args.processes, args.operations, args.compact_size)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+        else:
+            print(json.dumps(report, indent=2))
+        if not report['ok']:
+            sys.exit(1)
+    elif args.command == "memory":
+        bench_memory(args.rows)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,86 @@
+"""Fixed-width binary expense files, read through mmap.
+
+Layout (little-endian):
+    header   magic, format version, record count, journal sequence, heap offset
+    records  one RECORD per expense, in list order: amount, date, category, payment method,
+             description length and offset into the heap
+    heap     UTF-8 descriptions, each distinct one stored once
+
+The tracker always reads a whole file back into its lists; the mmap just lets that decode unpack
+the records in place, with each distinct description decoded once, instead of unpickling
+objects.
+
+Rows come back as (amount, description, category, payment_method, date) tuples, the same order
+as expense_key, so Expense(*row) rebuilds an expense."""
+import mmap
+import os
+import struct
+
+MAGIC = b"EXPREC\0\0"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sIIQQ")
+RECORD = struct.Struct("<ddBBHI")
+
+
+def write_records(path, expenses, seq):
+    """Atomically replace path with the given expenses; seq is the journal sequence they cover"""
+    heap = bytearray()
+    offsets = {}
+    records = bytearray(RECORD.size * len(expenses))
+    for i, e in enumerate(expenses):
+        text = e.description.encode('utf-8')
+        offset = offsets.get(text)
+        if offset is None:
+            offset = offsets[text] = len(heap)
+            heap += text
+        RECORD.pack_into(records, i * RECORD.size, e.amount, e.date, e.category, e.payment_method, len(text), offset)
+    heap_offset = HEADER.size + len(records)
+    tmp = path + ".tmp"
+    with open(tmp, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(expenses), seq, heap_offset))
+        f.write(records)
+        f.write(heap)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class RecordFile:
+    """Read-only view of a file written by write_records; iterating decodes every row in list order"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count, self.seq, self._heap = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self._map.close()
+            raise ValueError(f"{path} is not an expense record file")
+        self._descriptions = {}
+
+    def close(self):
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def _row(self, fields) -> tuple:
+        amount, date, category, payment_method, length, offset = fields
+        text = self._descriptions.get((offset, length))
+        if text is None:
+            start = self._heap + offset
+            text = self._descriptions[offset, length] = self._map[start:start + length].decode('utf-8')
+        return amount, text, category, payment_method, date
+
+    def __iter__(self):
+        records = memoryview(self._map)[HEADER.size:self._heap]
+        try:
+            for fields in RECORD.iter_unpack(records):
+                yield self._row(fields)
+        finally:
+            records.release()
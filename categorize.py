@@ -0,0 +1,183 @@
+"""Automatic categories for new expenses: the user's rules first, then what the history says.
+
+A rule maps a keyword (matched as whole words, in any case) or a regular expression to a
+category. The keywords are compiled into one Aho-Corasick automaton, which finds every keyword in
+a description in a single pass however many there are, and the regular expressions into one
+alternation (Python's re tries its branches one by one, so keywords are the cheaper rules). The
+rule that matches earliest in the description wins, and at the same place the one listed
+first. A description no rule matches takes the category that
+expenses with the same usual form (its words in lowercase, numbers left out) were given most
+often, provided that was more than LEARN_MIN_SHARE of them."""
+import re
+from collections import Counter, deque
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional
+
+import search
+
+LEARN_MIN_SHARE = 0.5
+
+
+@dataclass(frozen=True)
+class Rule:
+    pattern: str
+    category: str  # by name, so rules survive categories being added
+    regex: bool = False
+
+    def to_json(self) -> dict:
+        return asdict(self)
+
+    def expression(self) -> str:
+        return f"(?:{self.pattern})"
+
+
+def check_rule(rule: Rule, category_names):
+    """Raise ValueError if rule cannot be used as it is"""
+    if not rule.pattern.strip():
+        raise ValueError("the pattern is empty")
+    if rule.category not in category_names:
+        raise ValueError(f"unknown category '{rule.category}'")
+    if rule.regex:
+        try:
+            compiled = re.compile(rule.pattern)
+            # Also as it will sit in the combined pattern, after other rules (where a global (?i) is not allowed)
+            re.compile(f"(?P<r>x)|(?P<r0>{rule.expression()})", re.IGNORECASE)
+        except re.error as e:
+            raise ValueError(f"invalid regular expression '{rule.pattern}': {e}")
+        # The combined pattern numbers and names groups itself
+        if compiled.groupindex or re.search(r"\\[1-9]", rule.pattern):
+            raise ValueError("rule expressions may not name groups or refer back to them")
+
+
+def _is_word_char(ch) -> bool:
+    return ch.isalnum() or ch == '_'
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton over lowercase keywords. first() walks a text once, following
+    failure links on a mismatch instead of backing up, so it costs the text's length plus the
+    matches found, not the number of keywords."""
+
+    def __init__(self, keywords):
+        """keywords: (lowercase keyword, rule index) pairs"""
+        self._goto = [{}]
+        self._fail = [0]
+        # (keyword length, rule index) of every keyword ending at each state, its own and those of its failure chain
+        self._out = [[]]
+        self._longest = 0
+        for word, rule in keywords:
+            state = 0
+            for ch in word:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = self._goto[state][ch] = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = nxt
+            self._out[state].append((len(word), rule))
+            self._longest = max(self._longest, len(word))
+        # Breadth first, so every state's failure target is finished before the states below it
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def first(self, text) -> Optional[tuple]:
+        """(start, rule index) of the whole-word keyword found earliest in lowercase text, the
+        lowest rule index among those starting there, or None"""
+        goto, fail, out = self._goto, self._fail, self._out
+        best = None
+        state = 0
+        for i, ch in enumerate(text):
+            if best is not None and i - self._longest >= best[0]:
+                break  # every match still to come starts after the best one
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for length, rule in out[state]:
+                start = i - length + 1
+                # Word boundaries that also hold for keywords starting or ending in punctuation ("h&m")
+                if (start and _is_word_char(text[start - 1])) or (i + 1 < len(text) and _is_word_char(text[i + 1])):
+                    continue
+                if best is None or (start, rule) < best:
+                    best = (start, rule)
+        return best
+
+
+def usual_form(description) -> str:
+    """description reduced to what stays the same between repeats: 'Uber 12' and 'UBER' are both 'uber'"""
+    return " ".join(w for w in search.words(description) if not w.isdigit())
+
+
+class Categorizer:
+    def __init__(self):
+        self.rules: List[Rule] = []
+        self.category_names: List[str] = []
+        self._keywords: Optional[KeywordAutomaton] = None
+        self._expressions = None
+        # Category index of each usable rule, by rule index
+        self._targets: Dict[int, int] = {}
+        # usual form -> Counter of category index -> expenses
+        self._history: Dict[str, Counter] = {}
+
+    def use_rules(self, rules, category_names):
+        """Compile rules against category_names, unless they are the ones already compiled;
+        rules naming a category that no longer exists are left out"""
+        if rules == self.rules and category_names == self.category_names:
+            return
+        self.rules, self.category_names = list(rules), list(category_names)
+        usable = [(i, r) for i, r in enumerate(self.rules) if r.category in self.category_names]
+        self._targets = {i: self.category_names.index(r.category) for i, r in usable}
+        keywords = [(r.pattern.lower(), i) for i, r in usable if not r.regex]
+        self._keywords = KeywordAutomaton(keywords) if keywords else None
+        expressions = [f"(?P<r{i}>{r.expression()})" for i, r in usable if r.regex]
+        self._expressions = re.compile("|".join(expressions), re.IGNORECASE) if expressions else None
+
+    def relearn(self, history):
+        """Replace the history with (description, category, number of expenses) triples"""
+        self._history = {}
+        for description, category, n in history:
+            self.learn(description, category, n)
+
+    def learn(self, description, category, n=1):
+        self._history.setdefault(usual_form(description), Counter())[category] += n
+
+    def forget(self, description, category):
+        form = usual_form(description)
+        counts = self._history.get(form)
+        if counts is None:
+            return
+        counts[category] -= 1
+        if counts[category] <= 0:
+            del counts[category]
+            if not counts:
+                del self._history[form]
+
+    def rule_for(self, description) -> Optional[int]:
+        """Index into rules of the rule that decides description, or None"""
+        # Both matchers see the same lowercase text, so their positions compare
+        text = description.lower()
+        found = self._keywords.first(text) if self._keywords is not None else None
+        m = self._expressions.search(text) if self._expressions is not None else None
+        if m and (found is None or (m.start(), int(m.lastgroup[1:])) < found):
+            found = (m.start(), int(m.lastgroup[1:]))
+        return found[1] if found else None
+
+    def categorize(self, description) -> Optional[int]:
+        """Category index for description, or None if neither the rules nor the history decide it"""
+        rule = self.rule_for(description)
+        if rule is not None:
+            return self._targets[rule]
+        counts = self._history.get(usual_form(description))
+        if counts:
+            category, n = counts.most_common(1)[0]
+            if n > LEARN_MIN_SHARE * sum(counts.values()):
+                return category
+        return None
@@ -0,0 +1,132 @@
+"""Opt-in timing and counters for the expense tracker.
+
+Off by default, and then every hook returns at its first check. When enabled, named operations
+record their latency into log2 histograms and named counters accumulate (bytes loaded and saved,
+rows scanned by reports, report cache hits). A cProfile profiler can run for the whole session
+and be written out as a pstats file."""
+import atexit
+import functools
+import threading
+import time
+
+_enabled = False
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_profiler = None
+_profile_path = None
+
+
+class Histogram:
+    """Latencies bucketed by powers of two of microseconds: bucket b holds those under 2**b us"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = {}
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        b = int(seconds * 1e6).bit_length()
+        self.buckets[b] = self.buckets.get(b, 0) + 1
+
+    def percentile(self, p) -> float:
+        """Upper bound in seconds of the bucket holding the p-th percentile"""
+        rank = p / 100 * self.count
+        seen = 0
+        for b in sorted(self.buckets):
+            seen += self.buckets[b]
+            if seen >= rank:
+                return min(2 ** b / 1e6, self.max)
+        return self.max
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable(profile_path=None):
+    """Start recording; with profile_path, also profile the session and write it there on exit"""
+    global _enabled, _profiler, _profile_path
+    _enabled = True
+    if profile_path and _profiler is None:
+        import cProfile
+        _profile_path = profile_path
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+        atexit.register(dump_profile)
+
+
+def record(name, seconds):
+    with _lock:
+        hist = _histograms.get(name)
+        if hist is None:
+            hist = _histograms[name] = Histogram()
+        hist.add(seconds)
+
+
+def count(name, n=1):
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def timed(name):
+    """Decorator recording the latency of every call under name"""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+def dump_profile(path=None):
+    """Write the session profile so far as a pstats file (load it with pstats.Stats); returns its path"""
+    if _profiler is None:
+        return None
+    path = path or _profile_path
+    _profiler.disable()
+    try:
+        _profiler.dump_stats(path)
+    finally:
+        _profiler.enable()
+    return path
+
+
+def report() -> str:
+    """Latency table and counters as text"""
+    with _lock:
+        timings = sorted(_histograms.items())
+        counters = sorted(_counters.items())
+    lines = [f"{'Operation':<24} {'Calls':>7} {'Mean ms':>10} {'p50 ms':>10} {'p95 ms':>10} {'Max ms':>10}"]
+    lines.append("-" * 76)
+    for name, h in timings:
+        lines.append(f"{name:<24} {h.count:>7} {h.total / h.count * 1000:>10.3f} {h.percentile(50) * 1000:>10.3f} "
+                     f"{h.percentile(95) * 1000:>10.3f} {h.max * 1000:>10.3f}")
+    if not timings:
+        lines.append("No operations timed yet.")
+    lines.append("")
+    lines.append(f"{'Counter':<24} {'Value':>12}")
+    lines.append("-" * 37)
+    for name, value in counters:
+        lines.append(f"{name:<24} {value:>12}")
+    if not counters:
+        lines.append("No counters recorded yet.")
+    return "\n".join(lines)
@@ -1,10 +1,30 @@
 import os
+import sys
+import argparse
 import pickle
-import csv
+import json
+import threading
+import bisect
+import contextlib
+import functools
+import itertools
+from collections import Counter, OrderedDict
 from dataclasses import dataclass, field
-from typing import List, Optional
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Tuple
 from datetime import datetime, timedelta
 
+import binary_store
+import categorize
+import diagnostics
+import persistence
+import recurring
+import search
+
+# csv, concurrent.futures, sqlite_store and openpyxl are imported where they are used,
+# so starting the tracker does not pay for exports, the process pool or an unused engine
+if TYPE_CHECKING:
+    from sqlite_store import SQLiteStorage
+
 # Get the directory where this script is located
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -14,81 +34,1149 @@ MAX_DESC = 50
 MAX_CATEGORIES = 11
 MAX_FILENAME = 100
 MAX_MEMORY = 500
-MEMORY_FILE = os.path.join(SCRIPT_DIR, "expense_memory.dat")
-CURRENT_FILE = os.path.join(SCRIPT_DIR, "current_expenses.dat")
+MEMORY_FILE = os.path.join(SCRIPT_DIR, "expense_memory.bin")
+CURRENT_FILE = os.path.join(SCRIPT_DIR, "current_expenses.bin")
+# Pickled expense lists from older versions, converted to the files above on first load
+LEGACY_MEMORY_FILE = os.path.join(SCRIPT_DIR, "expense_memory.dat")
+LEGACY_CURRENT_FILE = os.path.join(SCRIPT_DIR, "current_expenses.dat")
 BALANCE_FILE = os.path.join(SCRIPT_DIR, "balance_history.dat")
 CATEGORY_FILE = os.path.join(SCRIPT_DIR, "categories.dat")
+RULES_FILE = os.path.join(SCRIPT_DIR, "category_rules.json")
+JOURNAL_FILE = os.path.join(SCRIPT_DIR, "expense_journal.dat")
+DB_FILE = os.path.join(SCRIPT_DIR, "expenses.db")
+# Locked by every process that changes the data files, so that they take turns
+LOCK_FILE = os.path.join(SCRIPT_DIR, "tracker.lock")
+DATA_FILES = ("MEMORY_FILE", "CURRENT_FILE", "LEGACY_MEMORY_FILE", "LEGACY_CURRENT_FILE", "BALANCE_FILE",
+              "CATEGORY_FILE", "RULES_FILE", "JOURNAL_FILE", "DB_FILE", "LOCK_FILE")
+# "pickle" keeps everything in memory backed by the snapshot files and journal; "sqlite" queries DB_FILE instead
+STORAGE_ENGINE = os.environ.get("EXPENSE_TRACKER_STORAGE", "pickle")
+# Timing histograms and counters (Settings > Diagnostics), and a session cProfile written to PROFILE_FILE
+DIAGNOSTICS = os.environ.get("EXPENSE_TRACKER_DIAGNOSTICS", "") not in ("", "0")
+PROFILE_FILE = os.environ.get("EXPENSE_TRACKER_PROFILE")
+JOURNAL_COMPACT_SIZE = 256 * 1024  # bytes of journal before it is folded into the snapshot
+# Changes are written by a background thread once none has come for FLUSH_DELAY seconds,
+# or FLUSH_MAX_DELAY seconds after the first if they keep coming
+FLUSH_DELAY = 0.5
+FLUSH_MAX_DELAY = 2.0
 MAX_PAYMENT_METHODS = 3
 MAX_BALANCE_HISTORY = 100
+LIST_PAGE_SIZE = 50
+REPORT_CACHE_SIZE = 128  # period totals kept for reuse until the data changes
+IMPORT_BATCH_SIZE = 1000
+# A search sorts the expenses of the matched descriptions rather than scan the date range only
+# when they are fewer than 1/SEARCH_SORT_RATIO of it
+SEARCH_SORT_RATIO = 8
+# Recurring expenses are looked for among those of the last three years, enough for three yearly ones
+RECURRING_LOOKBACK_DAYS = 3 * 366
+# How far ahead the recurring expenses report lists what falls due
+RECURRING_HORIZON_DAYS = 30
+# Statement column names accepted by import_statement, mapped to the Expense field they fill
+IMPORT_COLUMNS = {
+    'amount': 'amount', 'description': 'description', 'desc': 'description', 'narration': 'description',
+    'details': 'description', 'category': 'category', 'payment_method': 'payment_method',
+    'payment': 'payment_method', 'method': 'payment_method', 'date': 'date'
+}
+DATE_FORMATS = ("%d-%m-%Y", "%d/%m/%Y", "%d %m %Y", "%Y-%m-%d")
+INFO_PAGE_SIZE = 30
+# Distinct expense timestamps whose calendar fields are kept; expenses are dated at midnight, so this is days
+CALENDAR_CACHE_SIZE = 8192
 
 WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
 MONTH_NAMES = ["January", "February", "March", "April", "May", "June", "July", "August", "September", "October", "November", "December"]
 
+def _import_openpyxl():
+    """openpyxl, imported the first time an Excel export asks for it, or None if it is not installed"""
+    try:
+        import openpyxl
+    except ImportError:
+        return None
+    return openpyxl
+
+def _get_slot_state(obj):
+    """Pickle state of a slotted record: the same field dict older, unslotted versions pickled"""
+    return {name: getattr(obj, name) for name in obj.__slots__}
+
+def _set_slot_state(obj, state):
+    if isinstance(state, tuple):
+        state = state[1]
+    for name, value in state.items():
+        object.__setattr__(obj, name, value)
+
 @dataclass
 class Expense:
+    # Slots instead of a per-instance __dict__: histories hold many of these
+    __slots__ = ('amount', 'description', 'category', 'payment_method', 'date')
     amount: float
     description: str
     category: int
     payment_method: int
     date: float  # timestamp
 
+    def __post_init__(self):
+        # Recurring descriptions ("Groceries", "Metro") share one string
+        self.description = sys.intern(self.description)
+
+    __getstate__ = _get_slot_state
+    __setstate__ = _set_slot_state
+
+    def copy(self) -> 'Expense':
+        return Expense(self.amount, self.description, self.category, self.payment_method, self.date)
+
 @dataclass
 class BalanceEntry:
+    __slots__ = ('amount', 'date')
     amount: float
     date: float  # timestamp
 
+    __getstate__ = _get_slot_state
+    __setstate__ = _set_slot_state
+
+@dataclass
+class PeriodTotals:
+    count: int
+    total: float
+    category_totals: List[float]
+    payment_totals: List[float]
+    highest: Expense
+
+    def add(self, e: Expense):
+        """Fold one more expense into the count and sums; the caller picks the highest"""
+        self.count += 1
+        self.total += e.amount
+        self.category_totals[e.category] += e.amount
+        self.payment_totals[e.payment_method] += e.amount
+
+@dataclass
+class MonthForecast:
+    spent: float  # recorded in the month so far
+    recurring_due: float  # recurring expenses expected in the rest of it
+    daily_rate: float  # the other spending per day this month so far
+    days_left: int  # after today
+    upcoming: List[Tuple[float, recurring.Series]]  # (expected date, series), soonest first
+
+    @property
+    def projected(self) -> float:
+        return self.spent + self.recurring_due + self.daily_rate * self.days_left
+
+@dataclass(frozen=True)
+class CalendarDay:
+    """Local calendar fields of a timestamp, in the forms the listings and reports print"""
+    __slots__ = ('dt', 'year', 'month', 'text', 'weekday_name', 'month_name')
+    dt: datetime
+    year: int
+    month: int
+    text: str  # DD-MM-YYYY
+    weekday_name: str
+    month_name: str
+
+@functools.lru_cache(maxsize=CALENDAR_CACHE_SIZE)
+def calendar_day(ts) -> CalendarDay:
+    """Calendar fields of ts, converted once per distinct timestamp rather than once per row"""
+    dt = datetime.fromtimestamp(ts)
+    return CalendarDay(dt, dt.year, dt.month, dt.strftime('%d-%m-%Y'), WEEKDAYS[dt.weekday()], MONTH_NAMES[dt.month-1])
+
+def set_data_dir(path):
+    """Keep every data file in path instead of next to this script"""
+    os.makedirs(path, exist_ok=True)
+    for name in DATA_FILES:
+        globals()[name] = os.path.join(path, os.path.basename(globals()[name]))
+
+def expense_key(e: Expense) -> tuple:
+    """Hashable identity of an expense: the five fields is_duplicate compares"""
+    return (e.amount, e.description, e.category, e.payment_method, e.date)
+
+def _position(lst, target):
+    """Index of the very object target in lst (not just an equal one), newest entries first"""
+    for i in range(len(lst) - 1, -1, -1):
+        if lst[i] is target:
+            return i
+    return None
+
+def _month_of(ts) -> Tuple[int, int]:
+    day = calendar_day(ts)
+    return day.year, day.month
+
+def _inclusive_bounds(start_date, end_date) -> Tuple[float, float]:
+    """start_date <= dt <= end_date as timestamps start_ts <= ts < stop_ts"""
+    return start_date.timestamp(), (end_date + timedelta(microseconds=1)).timestamp()
+
+def _month_bounds(year, month) -> Tuple[float, float]:
+    """Timestamps of local midnight on the first of the month and of the month after"""
+    start = datetime(year, month, 1)
+    end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return start.timestamp(), end.timestamp()
+
+def parse_date(text) -> datetime:
+    """A DD-MM-YYYY (or DD/MM/YYYY, DD MM YYYY, YYYY-MM-DD) date at local midnight"""
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text.strip(), fmt)
+        except ValueError:
+            pass
+    raise ValueError(f"unrecognised date '{text}'")
+
+def resolve_choice(value, names, what) -> int:
+    """Index of value in names, given either as the index itself or as a name (any case)"""
+    value = str(value).strip()
+    if value.isdigit() and int(value) < len(names):
+        return int(value)
+    for i, name in enumerate(names):
+        if name.lower() == value.lower():
+            return i
+    raise ValueError(f"unknown {what} '{value}'")
+
+def read_statement(path) -> Iterator[dict]:
+    """Rows of a CSV (with a header line) or JSON (a list of objects) statement, keyed by field name"""
+    def fields(row):
+        named = ((str(k).strip().lower().replace(' ', '_'), v) for k, v in row.items())
+        return {IMPORT_COLUMNS[k]: v for k, v in named if k in IMPORT_COLUMNS}
+
+    if path.lower().endswith('.json'):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        for row in data.get('expenses', []) if isinstance(data, dict) else data:
+            yield fields(row)
+    else:
+        import csv
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            for row in csv.DictReader(f):
+                yield fields(row)
+
+class _DateSorted:
+    """Expenses kept in date order (oldest first), with their dates alongside for bisect"""
+
+    def __init__(self, items=()):
+        self.items = sorted(items, key=lambda e: e.date)
+        self.dates = [e.date for e in self.items]
+
+    def __len__(self):
+        return len(self.items)
+
+    def add(self, expense):
+        i = bisect.bisect_right(self.dates, expense.date)
+        self.items.insert(i, expense)
+        self.dates.insert(i, expense.date)
+
+    def remove(self, expense):
+        i = bisect.bisect_left(self.dates, expense.date)
+        while self.items[i] is not expense:
+            i += 1
+        del self.items[i]
+        del self.dates[i]
+
+    def between(self, start_ts, end_ts) -> List[Expense]:
+        """Expenses dated start_ts <= date <= end_ts, oldest first"""
+        return self.items[bisect.bisect_left(self.dates, start_ts):bisect.bisect_right(self.dates, end_ts)]
+
+    def newest_runs(self, start_ts, stop_ts) -> Iterator[List[Expense]]:
+        """Expenses dated start_ts <= date < stop_ts in runs of equal dates, newest run first,
+        copying one run at a time rather than the whole range"""
+        lo = bisect.bisect_left(self.dates, start_ts)
+        stop = bisect.bisect_left(self.dates, stop_ts)
+        while stop > lo:
+            start = bisect.bisect_left(self.dates, self.dates[stop - 1], lo, stop)
+            yield self.items[start:stop]
+            stop = start
+
+class _ReplayList:
+    """Applies journal deletes and edits to a long list in linear time: matched entries are
+    looked up by key and overwritten with None, and the gaps are squeezed out once at the end"""
+
+    def __init__(self, records):
+        self.records = records
+        self.slots = None
+
+    def _slots_for(self, key):
+        if self.slots is None:
+            self.slots = {}
+            for i, e in enumerate(self.records):
+                if e is not None:
+                    self.slots.setdefault(expense_key(e), []).append(i)
+        return self.slots.setdefault(key, [])
+
+    def append(self, expense):
+        if self.slots is not None:
+            self.slots.setdefault(expense_key(expense), []).append(len(self.records))
+        self.records.append(expense)
+
+    def replace(self, key, expense):
+        """Overwrite the first entry matching key; None deletes it"""
+        slots = self._slots_for(key)
+        if not slots:
+            return
+        i = slots.pop(0)
+        self.records[i] = expense
+        if expense is not None:
+            self._slots_for(expense_key(expense)).append(i)
+
+    def result(self):
+        return [e for e in self.records if e is not None]
+
+def _write_snapshot_file(path, records, seq):
+    """Atomically replace a snapshot file with records and the journal sequence they cover"""
+    binary_store.write_records(path, records, seq)
+
+def _read_snapshot_file(path):
+    with binary_store.RecordFile(path) as f:
+        return [Expense(*row) for row in f], f.seq
+
+def _snapshot_seq(path) -> int:
+    """Journal sequence a snapshot file covers, or -1 if there is none"""
+    if not os.path.exists(path):
+        return -1
+    with binary_store.RecordFile(path) as f:
+        return f.seq
+
+def _journal_lines(f):
+    """(line, record) for each complete line of a journal from the file's position on; record is
+    None for a line that is not valid JSON. A last line without its newline, cut short by a
+    crash, is left out."""
+    for line in f:
+        if not line.endswith(b'\n'):
+            break
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield line, record if isinstance(record, dict) and 'seq' in record else None
+
+class _SafeUnpickler(pickle.Unpickler):
+    """Unpickler for the app's own files that refuses to build anything but its data classes,
+    whichever module name they were pickled under"""
+
+    def find_class(self, module, name):
+        if module in ("__main__", __name__) and name in ("Expense", "BalanceEntry"):
+            return globals()[name]
+        raise pickle.UnpicklingError(f"unexpected {module}.{name} in data file")
+
+def _read_legacy_snapshot(path):
+    with open(path, 'rb') as f:
+        unpickler = _SafeUnpickler(f)
+        records = unpickler.load()
+        try:
+            seq = unpickler.load().get('seq', 0)
+        except EOFError:
+            # Snapshot written before the journal existed
+            seq = 0
+    return records, seq
+
+@diagnostics.timed("write_data_file")
+def _write_data_file(path, data):
+    persistence.atomic_write(path, data)
+    diagnostics.count("save.bytes", len(data))
+
+def _read_balance_file(path) -> dict:
+    data = {}
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            data = _SafeUnpickler(f).load()
+            diagnostics.count("load.bytes", f.tell())
+    return {
+        'bank_balance': data.get('bank_balance', 0.0),
+        'cash_balance': data.get('cash_balance', 0.0),
+        'bank_history': data.get('bank_history', []),
+        'cash_history': data.get('cash_history', [])
+    }
+
+def _merge_balance(base, ours, theirs) -> dict:
+    """Balances this process changed since base keep its value, the others take theirs; history
+    entries it added join theirs in date order"""
+    merged = dict(theirs)
+    for kind in ('bank', 'cash'):
+        if ours[f'{kind}_balance'] != base[f'{kind}_balance']:
+            merged[f'{kind}_balance'] = ours[f'{kind}_balance']
+        known = base[f'{kind}_history'] + theirs[f'{kind}_history']
+        added = [h for h in ours[f'{kind}_history'] if h not in known]
+        history = sorted(theirs[f'{kind}_history'] + added, key=lambda h: h.date)
+        merged[f'{kind}_history'] = history[-MAX_BALANCE_HISTORY:]
+    return merged
+
+def _read_category_file(path) -> List[str]:
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+def _merge_categories(base, ours, theirs) -> List[str]:
+    """Theirs, then the names this process added since base, up to MAX_CATEGORIES; categories are
+    referred to by position, so theirs keep theirs"""
+    added = [name for name in ours if name not in base and name not in theirs]
+    return (theirs + added)[:MAX_CATEGORIES]
+
+def _read_rules_file(path) -> List[categorize.Rule]:
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return [categorize.Rule(**rule) for rule in json.load(f)]
+
+def _encode_rules(rules) -> bytes:
+    return json.dumps([rule.to_json() for rule in rules], indent=2).encode('utf-8')
+
+def _merge_rules(base, ours, theirs) -> List[categorize.Rule]:
+    """Theirs without the rules this process removed since base, then the ones it added"""
+    return [r for r in theirs if r in ours or r not in base] + [r for r in ours if r not in base and r not in theirs]
+
+def _convert_legacy_snapshots():
+    """One-time conversion of pickled expense lists to binary record files; the old files are kept as .bak"""
+    for legacy, path in ((LEGACY_CURRENT_FILE, CURRENT_FILE), (LEGACY_MEMORY_FILE, MEMORY_FILE)):
+        if os.path.exists(legacy) and not os.path.exists(path):
+            records, seq = _read_legacy_snapshot(legacy)
+            _write_snapshot_file(path, records, seq)
+            os.replace(legacy, legacy + ".bak")
+            print(f"Converted {os.path.basename(legacy)} to {os.path.basename(path)}.")
+
+def _needs(*datasets, refresh=True):
+    """Method decorator: first load whichever of the named datasets ("expenses", "balance")
+    init_tracker left for later, so each is read from disk only once something uses it, and pick
+    up changes other processes have saved to them. refresh=False skips the latter, for methods
+    that pick an expense by its position in a listing the user has just seen."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            if self._deferred:
+                self._load_deferred(datasets)
+            if refresh:
+                self._refresh(datasets)
+            return fn(self, *args, **kwargs)
+        return wrapper
+    return decorate
+
 @dataclass
 class ExpenseTracker:
     expenses: List[Expense] = field(default_factory=list)
     memory: List[Expense] = field(default_factory=list)
     category_names: List[str] = field(default_factory=list)
+    # Checked in order by suggest_category; see categorize.py
+    category_rules: List[categorize.Rule] = field(default_factory=list)
     payment_method_names: List[str] = field(default_factory=lambda: ["Cash", "UPI", "Card"])
     bank_balance: float = 0.0
     cash_balance: float = 0.0
     bank_history: List[BalanceEntry] = field(default_factory=list)
     cash_history: List[BalanceEntry] = field(default_factory=list)
+    storage: str = field(default_factory=lambda: STORAGE_ENGINE)
+    _db: Optional["SQLiteStorage"] = field(default=None, init=False, repr=False)
+    # Sequence number of the last journal record applied to the lists; numbers run on across
+    # every process sharing the files, as each appends only under _lock and after catching up
+    _journal_seq: int = field(default=0, init=False, repr=False)
+    # How far into the journal this process has read, and the journal's file stamp at that point;
+    # None while the lists were not loaded from the files (SQLite engine, detached copies)
+    _journal_offset: int = field(default=0, init=False, repr=False)
+    _journal_stamp: Optional[tuple] = field(default=None, init=False, repr=False)
+    _journal_fd: Optional[int] = field(default=None, init=False, repr=False)
+    _lock: persistence.FileLock = field(default_factory=lambda: persistence.FileLock(LOCK_FILE), init=False, repr=False)
+    _balance_file: persistence.SharedFile = field(default=None, init=False, repr=False)
+    _category_file: persistence.SharedFile = field(default=None, init=False, repr=False)
+    _rules_file: persistence.SharedFile = field(default=None, init=False, repr=False)
+    _writer: persistence.WriteBehind = field(
+        default_factory=lambda: persistence.WriteBehind(FLUSH_DELAY, FLUSH_MAX_DELAY), init=False, repr=False
+    )
+    _compactor: Optional[threading.Thread] = field(default=None, init=False, repr=False)
+    # expense_key -> distinct Expense objects across both lists; _refs counts the lists holding each object
+    _index: Dict[tuple, List[Expense]] = field(default_factory=dict, init=False, repr=False)
+    _refs: Dict[int, int] = field(default_factory=dict, init=False, repr=False)
+    # id -> insertion rank of each distinct object, main list first. Exports list equal dates in
+    # rank order, and ties for the highest expense go to the lowest rank, as with plain lists
+    _ranks: Dict[int, int] = field(default_factory=dict, init=False, repr=False)
+    _next_rank: int = field(default=0, init=False, repr=False)
+    # The same distinct objects sorted by date, overall and per (year, month)
+    _view: _DateSorted = field(default_factory=_DateSorted, init=False, repr=False)
+    _months: Dict[Tuple[int, int], _DateSorted] = field(default_factory=dict, init=False, repr=False)
+    # Word index over descriptions, built by the first search; with the database, the version it was built at
+    _search: Optional[search.SearchIndex] = field(default=None, init=False, repr=False)
+    _search_version: Optional[tuple] = field(default=None, init=False, repr=False)
+    # Compiled category rules and the description -> category history, built by the first suggestion
+    _categorizer: Optional[categorize.Categorizer] = field(default=None, init=False, repr=False)
+    _categorizer_version: Optional[tuple] = field(default=None, init=False, repr=False)
+    # (year, month, category, payment_method) -> [total, count, highest expense or None until recomputed]
+    _rollup: Dict[Tuple[int, int, int, int], list] = field(default_factory=dict, init=False, repr=False)
+    # Bumped by every change to expenses or categories; report results are cached against it
+    _data_version: int = field(default=0, init=False, repr=False)
+    _reports: OrderedDict = field(default_factory=OrderedDict, init=False, repr=False)
+    # Datasets init_tracker has not loaded yet; see _needs
+    _deferred: set = field(default_factory=set, init=False, repr=False)
+
+    def __post_init__(self):
+        self._balance_file = persistence.SharedFile(BALANCE_FILE, self._lock, _read_balance_file,
+                                                    pickle.dumps, _merge_balance, _write_data_file)
+        self._category_file = persistence.SharedFile(
+            CATEGORY_FILE, self._lock, _read_category_file,
+            lambda names: ''.join(cat + '\n' for cat in names).encode('utf-8'), _merge_categories, _write_data_file
+        )
+        self._rules_file = persistence.SharedFile(RULES_FILE, self._lock, _read_rules_file, _encode_rules,
+                                                  _merge_rules, _write_data_file)
 
+    @_needs("expenses", refresh=False)
     def save_expenses(self):
-        with open(CURRENT_FILE, 'wb') as f:
-            pickle.dump(self.expenses, f)
-        with open(MEMORY_FILE, 'wb') as f:
-            pickle.dump(self.memory, f)
+        """Write a full snapshot of both lists under a new sequence number, so that other
+        processes reload it, and drop the journal records it covers. Called after bulk changes,
+        inside _committing."""
+        if self._db is not None:
+            return  # every change is committed as it happens
+        with self._lock:
+            self._journal_seq += 1
+            self._write_snapshot(list(self.expenses), list(self.memory), self._journal_seq)
 
+    def flush(self):
+        """Finish every pending and running write; called on exit"""
+        self._writer.flush()
+        self._wait_for_compaction()
+
+    @diagnostics.timed("load_expenses")
     def load_expenses(self):
-        if os.path.exists(CURRENT_FILE):
-            with open(CURRENT_FILE, 'rb') as f:
-                self.expenses = pickle.load(f)
-        if os.path.exists(MEMORY_FILE):
-            with open(MEMORY_FILE, 'rb') as f:
-                self.memory = pickle.load(f)
+        if self._db is not None:
+            return  # queried on demand
+        # Locked so that no compaction replaces the snapshots and journal halfway through reading them
+        with self._lock:
+            _convert_legacy_snapshots()
+            expenses_seq = memory_seq = 0
+            self.expenses, self.memory = [], []
+            if os.path.exists(CURRENT_FILE):
+                self.expenses, expenses_seq = _read_snapshot_file(CURRENT_FILE)
+                diagnostics.count("load.bytes", os.path.getsize(CURRENT_FILE))
+            if os.path.exists(MEMORY_FILE):
+                self.memory, memory_seq = _read_snapshot_file(MEMORY_FILE)
+                diagnostics.count("load.bytes", os.path.getsize(MEMORY_FILE))
+            self._journal_seq = max(expenses_seq, memory_seq)
+            self._replay_journal(expenses_seq, memory_seq)
+        self._rebuild_index()
+
+    @diagnostics.timed("write_snapshot")
+    def _write_snapshot(self, expenses, memory, seq):
+        with self._lock:
+            # Another process may have written a later snapshot meanwhile; never go back to an older one
+            if _snapshot_seq(CURRENT_FILE) >= seq:
+                return
+            # Expenses first, then memory, then the journal: a crash in between leaves each
+            # file tagged with the sequence it covers, so replay never applies a record twice
+            _write_snapshot_file(CURRENT_FILE, expenses, seq)
+            _write_snapshot_file(MEMORY_FILE, memory, seq)
+            self._truncate_journal(seq)
+        if diagnostics.enabled():
+            diagnostics.count("save.bytes", os.path.getsize(CURRENT_FILE) + os.path.getsize(MEMORY_FILE))
+
+    def _wait_for_compaction(self):
+        if self._compactor is not None:
+            self._compactor.join()
+            self._compactor = None
+
+    def _start_compaction(self):
+        """Snapshot the lists in the background; called under _lock, with the lists up to date"""
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+        # Expense objects are never mutated while a compaction may be running (edits
+        # swap in new objects), so shallow copies of the lists are a consistent snapshot
+        self._compactor = threading.Thread(
+            target=self._write_snapshot,
+            args=(list(self.expenses), list(self.memory), self._journal_seq),
+            name="journal-compactor"
+        )
+        self._compactor.start()
+
+    @contextlib.contextmanager
+    def _committing(self):
+        """Hold _lock and catch up with other processes first, so that a change made inside is
+        made to current data and journaled after theirs"""
+        with self._lock:
+            self._catch_up()
+            yield
+            # Only now do the lists hold every record journaled, as a snapshot must
+            if self._journal_offset > JOURNAL_COMPACT_SIZE:
+                self._start_compaction()
+
+    def _journal(self, record):
+        """Append one add/edit/delete record to the journal, inside _committing. It is written at
+        once so other processes see it; the fsync is left to the background writer, so records
+        made close together share one."""
+        record['seq'] = self._journal_seq + 1
+        line = (json.dumps(record) + '\n').encode('utf-8')
+        # Kept open between records; reopened once a compaction has replaced the file
+        if self._journal_fd is None or not self._journal_stamp or os.fstat(self._journal_fd).st_ino != self._journal_stamp[0]:
+            if self._journal_fd is not None:
+                os.close(self._journal_fd)
+            self._journal_fd = os.open(JOURNAL_FILE, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(self._journal_fd, line)
+        except OSError:
+            # Leave no partial record behind
+            os.ftruncate(self._journal_fd, self._journal_offset)
+            raise
+        self._journal_seq += 1
+        self._journal_offset += len(line)
+        self._journal_stamp = persistence.file_stamp(self._journal_fd)
+        diagnostics.count("save.journal_bytes", len(line))
+        self._writer.schedule("journal", self._sync_journal)
+
+    @diagnostics.timed("journal_flush")
+    def _sync_journal(self):
+        try:
+            with open(JOURNAL_FILE, 'r+b') as f:
+                os.fsync(f.fileno())
+        except FileNotFoundError:
+            pass
+
+    def _truncate_journal(self, seq):
+        """Drop the records a snapshot at seq covers; called under _lock"""
+        if not os.path.exists(JOURNAL_FILE):
+            return
+        with open(JOURNAL_FILE, 'rb') as f:
+            keep = [(line, record['seq']) for line, record in _journal_lines(f) if record and record['seq'] > seq]
+        persistence.atomic_write(JOURNAL_FILE, b''.join(line for line, _ in keep))
+        # Records other processes appended after this one last caught up are still to be read
+        self._journal_offset = sum(len(line) for line, s in keep if s <= self._journal_seq)
+        # and a stamp no file has makes the next _catch_up read them
+        unread = any(s > self._journal_seq for _, s in keep)
+        self._journal_stamp = () if unread else persistence.file_stamp(JOURNAL_FILE)
+
+    def _catch_up(self):
+        """Bring the lists up to date with the changes other processes have saved, from the
+        journal where it still holds them, or by reloading everything; called under _lock"""
+        if self._db is not None or self._journal_stamp is None:
+            return
+        stamp = persistence.file_stamp(JOURNAL_FILE)
+        if stamp == self._journal_stamp:
+            return
+        diagnostics.count("sync.catch_ups")
+        if stamp and self._journal_stamp and stamp[0] == self._journal_stamp[0] and stamp[1] >= self._journal_offset:
+            if self._follow_journal(self._journal_offset):
+                return
+        # The journal was rewritten by a compaction: the records this process has not seen are
+        # still in it unless the new snapshot covers them
+        if max(_snapshot_seq(CURRENT_FILE), _snapshot_seq(MEMORY_FILE)) <= self._journal_seq and self._follow_journal(0):
+            return
+        diagnostics.count("sync.reloads")
+        self.load_expenses()
+
+    def _follow_journal(self, offset) -> bool:
+        """Apply the records from offset on that this process has not seen; False, changing
+        nothing, if they do not carry on from the last one it has"""
+        records = []
+        good = offset
+        if os.path.exists(JOURNAL_FILE):
+            with open(JOURNAL_FILE, 'rb') as f:
+                f.seek(offset)
+                for line, record in _journal_lines(f):
+                    if record is None:
+                        return False
+                    good += len(line)
+                    # Read from the start, the records seen already come first
+                    if offset or record['seq'] > self._journal_seq:
+                        records.append(record)
+        if any(r['seq'] != self._journal_seq + 1 + i for i, r in enumerate(records)):
+            return False
+        for record in records:
+            self._apply_live(record)
+        self._journal_seq += len(records)
+        if os.path.exists(JOURNAL_FILE) and os.path.getsize(JOURNAL_FILE) > good:
+            # A record another process left half-written when it crashed
+            os.truncate(JOURNAL_FILE, good)
+        self._journal_offset = good
+        self._journal_stamp = persistence.file_stamp(JOURNAL_FILE)
+        return True
 
+    def _apply_live(self, record):
+        """Apply a journal record from another process to the lists and indexes"""
+        op = record['op']
+        if op == 'add':
+            self._insert(Expense(*record['expense']))
+        elif op in ('delete', 'edit'):
+            bucket = self._index.get(tuple(record['expense' if op == 'delete' else 'old']))
+            if bucket and op == 'delete':
+                self._delete(bucket[0])
+            elif bucket:
+                self._swap(bucket[0], Expense(*record['new']))
+        elif op == 'clear_memory':
+            self._clear_memory()
+
+    def _refresh(self, datasets):
+        """Pick up what other processes saved to the named datasets (and categories) since this one last looked"""
+        if self._db is not None:
+            return
+        if "expenses" in datasets and self._journal_stamp is not None \
+                and persistence.file_stamp(JOURNAL_FILE) != self._journal_stamp:
+            with self._lock:
+                self._catch_up()
+        if "balance" in datasets and self._balance_file.changed():
+            self.load_balance()
+        if self._category_file.changed():
+            self.load_categories()
+        if self._rules_file.changed():
+            self.load_rules()
+
+    @diagnostics.timed("replay_journal")
+    def _replay_journal(self, expenses_seq, memory_seq):
+        if not os.path.exists(JOURNAL_FILE):
+            self._journal_offset, self._journal_stamp = 0, ()
+            return
+        good = 0
+        expenses = _ReplayList(self.expenses)
+        with open(JOURNAL_FILE, 'rb') as f:
+            for line, record in _journal_lines(f):
+                # A record cut short by a crash ends the journal
+                if record is None:
+                    break
+                good += len(line)
+                seq = record['seq']
+                self._apply_record(record, expenses if seq > expenses_seq else None, seq > memory_seq)
+                self._journal_seq = max(self._journal_seq, seq)
+        self.expenses = expenses.result()
+        if good < os.path.getsize(JOURNAL_FILE):
+            os.truncate(JOURNAL_FILE, good)
+        self._journal_offset = good
+        self._journal_stamp = persistence.file_stamp(JOURNAL_FILE)
+        diagnostics.count("load.bytes", good)
+
+    def _apply_record(self, record, expenses, to_memory):
+        # expenses is the _ReplayList for the main list, or None when its snapshot already covers the record;
+        # memory is at most MAX_MEMORY long, so it is patched directly
+        op = record['op']
+        if op == 'add':
+            expense = Expense(*record['expense'])
+            if expenses is not None:
+                expenses.append(expense)
+            if to_memory:
+                self.memory.insert(0, expense)
+                if len(self.memory) > MAX_MEMORY:
+                    self.memory = self.memory[:MAX_MEMORY]
+        elif op in ('delete', 'edit'):
+            if op == 'delete':
+                key, new = tuple(record['expense']), None
+            else:
+                key, new = tuple(record['old']), Expense(*record['new'])
+            if expenses is not None:
+                expenses.replace(key, new)
+            if to_memory:
+                for i, e in enumerate(self.memory):
+                    if expense_key(e) == key:
+                        if new is None:
+                            self.memory.pop(i)
+                        else:
+                            self.memory[i] = new
+                        break
+        elif op == 'clear_memory':
+            if to_memory:
+                self.memory = []
+
+    def _link(self, expense, rank=None):
+        """Record that one more list holds expense; the first one makes it visible, ranked after
+        every other expense unless given the rank of the one it replaces"""
+        self._data_version += 1
+        refs = self._refs.get(id(expense), 0)
+        self._refs[id(expense)] = refs + 1
+        if not refs:
+            if rank is None:
+                rank, self._next_rank = self._next_rank, self._next_rank + 1
+            self._ranks[id(expense)] = rank
+            self._index.setdefault(expense_key(expense), []).append(expense)
+            self._view.add(expense)
+            month = _month_of(expense.date)
+            if month not in self._months:
+                self._months[month] = _DateSorted()
+            self._months[month].add(expense)
+            self._roll_in(expense, month)
+            if self._search is not None:
+                self._search.add(expense.description, expense)
+            if self._categorizer is not None:
+                self._categorizer.learn(expense.description, expense.category)
+
+    def _unlink(self, expense):
+        """Record that one list dropped expense; the last one hides it again"""
+        self._data_version += 1
+        refs = self._refs.pop(id(expense)) - 1
+        if refs:
+            self._refs[id(expense)] = refs
+            return
+        key = expense_key(expense)
+        bucket = self._index[key]
+        del bucket[_position(bucket, expense)]
+        if not bucket:
+            del self._index[key]
+        self._view.remove(expense)
+        month = _month_of(expense.date)
+        self._months[month].remove(expense)
+        if not self._months[month]:
+            del self._months[month]
+        self._roll_out(expense, month)
+        del self._ranks[id(expense)]
+        if self._search is not None:
+            self._search.discard(expense.description, expense)
+        if self._categorizer is not None:
+            self._categorizer.forget(expense.description, expense.category)
+
+    def _roll_in(self, expense, month):
+        key = month + (expense.category, expense.payment_method)
+        bucket = self._rollup.get(key)
+        if bucket is None:
+            self._rollup[key] = [expense.amount, 1, expense]
+            return
+        bucket[0] += expense.amount
+        bucket[1] += 1
+        if bucket[2] is not None and self._outranks(expense, bucket[2]):
+            bucket[2] = expense
+
+    def _outranks(self, a: Expense, b: Expense) -> bool:
+        """Whether a rather than b is the highest expense: it is larger, or as large and added first"""
+        return a.amount > b.amount or (a.amount == b.amount and self._ranks[id(a)] < self._ranks[id(b)])
+
+    def _roll_out(self, expense, month):
+        """Take expense out of its rollup bucket; if it was the bucket's highest, only that bucket
+        forgets its highest, to be found again from the month's expenses when next asked for"""
+        key = month + (expense.category, expense.payment_method)
+        bucket = self._rollup[key]
+        bucket[1] -= 1
+        if not bucket[1]:
+            del self._rollup[key]
+            return
+        bucket[0] -= expense.amount
+        if bucket[2] is expense:
+            bucket[2] = None
+
+    @diagnostics.timed("rebuild_index")
+    def _rebuild_index(self):
+        self._data_version += 1
+        self._index = {}
+        self._refs = {}
+        for e in self.expenses:
+            self._index.setdefault(expense_key(e), []).append(e)
+            self._refs[id(e)] = self._refs.get(id(e), 0) + 1
+        # Memory is loaded from its own file, so its entries are copies: swap each one for the
+        # matching object in the main list so that both lists share it, as they do after add_expense
+        claimed = {}
+        for i, e in enumerate(self.memory):
+            key = expense_key(e)
+            twins = self._index.setdefault(key, [])
+            n = claimed.get(key, 0)
+            if n < len(twins):
+                e = self.memory[i] = twins[n]
+            else:
+                twins.append(e)
+            claimed[key] = n + 1
+            self._refs[id(e)] = self._refs.get(id(e), 0) + 1
+        visible = self.expenses + [e for e in self.memory if self._refs[id(e)] == 1]
+        self._ranks = {id(e): i for i, e in enumerate(visible)}
+        self._next_rank = len(visible)
+        self._view = _DateSorted(visible)
+        # Cut the sorted view at month boundaries rather than converting every date
+        self._months = {}
+        self._rollup = {}
+        items, dates = self._view.items, self._view.dates
+        i = 0
+        while i < len(items):
+            month = _month_of(dates[i])
+            j = bisect.bisect_left(dates, _month_bounds(*month)[1], i)
+            self._months[month] = _DateSorted(items[i:j])
+            for e in items[i:j]:
+                self._roll_in(e, month)
+            i = j
+        # Rebuilt from the view the next time a search is run
+        self._search = None
+        if self._categorizer is not None:
+            self._categorizer.relearn(self._description_categories())
+
+    @_needs("expenses")
+    def all_expenses(self) -> List[Expense]:
+        """Main list and memory merged without duplicates, oldest first"""
+        return self._view.items
+
+    @_needs("expenses")
+    def month_expenses(self, year, month) -> List[Expense]:
+        """Expenses dated in the given month, oldest first"""
+        if self._db is not None:
+            return [Expense(*row) for row in self._db.between(*_month_bounds(year, month))]
+        bucket = self._months.get((year, month))
+        return bucket.items if bucket else []
+
+    @_needs("expenses")
+    def expenses_between(self, start_date, end_date) -> List[Expense]:
+        """Expenses dated from start_date to end_date inclusive, oldest first"""
+        if self._db is not None:
+            return [Expense(*row) for row in self._db.between(*_inclusive_bounds(start_date, end_date))]
+        return self._view.between(start_date.timestamp(), end_date.timestamp())
+
+    @_needs("expenses")
+    def _added_between(self, start_ts, stop_ts) -> List[Expense]:
+        """Expenses dated start_ts <= date < stop_ts in the order they were added, as _detached takes them"""
+        if self._db is not None:
+            return [Expense(*row) for row in self._db.added_between(start_ts, stop_ts)]
+        items, dates = self._view.items, self._view.dates
+        run = items[bisect.bisect_left(dates, start_ts):bisect.bisect_left(dates, stop_ts)]
+        return sorted(run, key=lambda e: self._ranks[id(e)])
+
+    def _version(self):
+        """Changes whenever expenses or categories do, including writes to the database by other processes"""
+        if self._db is not None:
+            return self._data_version, self._db.version()
+        return self._data_version
+
+    def _cached(self, key, compute):
+        """compute(), or its result from an earlier call under key if nothing has changed since"""
+        version = self._version()
+        entry = self._reports.get(key)
+        if entry is not None and entry[0] == version:
+            self._reports.move_to_end(key)
+            diagnostics.count("report.cache_hits")
+            return entry[1]
+        diagnostics.count("report.cache_misses")
+        result = compute()
+        self._remember(key, result, version)
+        return result
+
+    def _remember(self, key, result, version):
+        self._reports[key] = (version, result)
+        self._reports.move_to_end(key)
+        while len(self._reports) > REPORT_CACHE_SIZE:
+            self._reports.popitem(last=False)
+
+    @_needs("expenses")
+    def _month_totals(self, year, month) -> Optional[PeriodTotals]:
+        return self._cached(('month', year, month), lambda: self._rollup_totals(year, month))
+
+    def _rollup_totals(self, year, month) -> Optional[PeriodTotals]:
+        """Totals for a month, read from its rollup buckets rather than from its expenses"""
+        categories, methods = len(self.category_names), len(self.payment_method_names)
+        if self._db is not None:
+            return self._db_totals(self._db.month_totals(year, month, *_month_bounds(year, month), categories, methods))
+        totals = PeriodTotals(0, 0.0, [0.0]*categories, [0.0]*methods, None)
+        for category in range(categories):
+            for payment_method in range(methods):
+                bucket = self._rollup.get((year, month, category, payment_method))
+                if bucket is None:
+                    continue
+                diagnostics.count("report.buckets_read")
+                if bucket[2] is None:
+                    diagnostics.count("report.rows_scanned", len(self._months[(year, month)]))
+                    bucket[2] = min((e for e in self._months[(year, month)].items
+                                     if e.category == category and e.payment_method == payment_method),
+                                    key=lambda e: (-e.amount, self._ranks[id(e)]))
+                totals.count += bucket[1]
+                totals.total += bucket[0]
+                totals.category_totals[category] += bucket[0]
+                totals.payment_totals[payment_method] += bucket[0]
+                if totals.highest is None or self._outranks(bucket[2], totals.highest):
+                    totals.highest = bucket[2]
+        return totals if totals.count else None
+
+    @_needs("expenses")
+    def _range_totals(self, start_date, end_date) -> Optional[PeriodTotals]:
+        return self._cached(('range',) + _inclusive_bounds(start_date, end_date),
+                            lambda: self._scan_totals(start_date, end_date))
+
+    def _scan_totals(self, start_date, end_date) -> Optional[PeriodTotals]:
+        if self._db is not None:
+            return self._db_totals(self._db.totals(*_inclusive_bounds(start_date, end_date),
+                                                   len(self.category_names), len(self.payment_method_names)))
+        return self._period_totals(self.expenses_between(start_date, end_date))
+
+    def _db_totals(self, result) -> Optional[PeriodTotals]:
+        if result is None:
+            return None
+        count, total, cat_totals, pm_totals, highest = result
+        return PeriodTotals(count, total, cat_totals, pm_totals, Expense(*highest))
+
+    def _period_totals(self, rows) -> Optional[PeriodTotals]:
+        """Category, payment method and overall totals plus the highest expense for a date-sorted
+        run of expenses as month_expenses and expenses_between return them, or None if it is empty"""
+        if not rows:
+            return None
+        diagnostics.count("report.rows_scanned", len(rows))
+        categories, methods = len(self.category_names), len(self.payment_method_names)
+        cat_totals = [0.0]*categories
+        pm_totals = [0.0]*methods
+        for e in rows:
+            cat_totals[e.category] += e.amount
+            pm_totals[e.payment_method] += e.amount
+        highest = min(rows, key=lambda e: (-e.amount, self._ranks[id(e)]))
+        return PeriodTotals(len(rows), sum(cat_totals), cat_totals, pm_totals, highest)
+
+    def _search_index(self) -> search.SearchIndex:
+        """The description index, built from the view the first time a search needs it and kept up to
+        date by _link and _unlink; with the database, built from its distinct descriptions again
+        whenever the data has changed"""
+        if self._db is not None:
+            version = self._version()
+            if self._search is None or self._search_version != version:
+                self._search = search.SearchIndex()
+                for description in self._db.descriptions():
+                    self._search.add(description, description)
+                self._search_version = version
+        elif self._search is None:
+            self._search = search.SearchIndex()
+            for e in self._view.items:
+                self._search.add(e.description, e)
+        return self._search
+
+    @diagnostics.timed("search")
+    @_needs("expenses")
+    def search_expenses(self, text="", category=None, payment_method=None, min_amount=None, max_amount=None,
+                        start_date=None, end_date=None) -> List[Expense]:
+        """Expenses whose description matches every word of text (as a word, the start of one, or
+        one typo away; see search.py) and that pass each filter given, newest first. The amounts
+        and dates bound the range inclusively; None leaves that side open."""
+        index = self._search_index()
+        descriptions = index.matching(text)
+        if descriptions is not None and not descriptions:
+            return []
+        start_ts = start_date.timestamp() if start_date else float('-inf')
+        stop_ts = _inclusive_bounds(end_date, end_date)[1] if end_date else float('inf')
+        if self._db is not None:
+            return [Expense(*row) for row in self._db.search(descriptions, category, payment_method,
+                                                             min_amount, max_amount, start_ts, stop_ts)]
+        view = self._view
+        lo, hi = bisect.bisect_left(view.dates, start_ts), bisect.bisect_left(view.dates, stop_ts)
+        if descriptions is None:
+            rows = view.items[lo:hi]
+        elif sum(len(index.rows[d]) for d in descriptions) * SEARCH_SORT_RATIO < hi - lo:
+            # Few of the expenses in the dates carry a matched description: sorting just those beats
+            # scanning the dates
+            rows = sorted((e for d in descriptions for e in index.rows[d].values() if start_ts <= e.date < stop_ts),
+                          key=lambda e: e.date)
+        else:
+            rows = [e for e in view.items[lo:hi] if e.description in descriptions]
+        diagnostics.count("search.rows_scanned", len(rows))
+        if category is not None:
+            rows = [e for e in rows if e.category == category]
+        if payment_method is not None:
+            rows = [e for e in rows if e.payment_method == payment_method]
+        if min_amount is not None:
+            rows = [e for e in rows if e.amount >= min_amount]
+        if max_amount is not None:
+            rows = [e for e in rows if e.amount <= max_amount]
+        return rows[::-1]
+
+    def show_search_results(self, results, page=0) -> bool:
+        """Show one page of search_expenses results; returns True if there are more pages"""
+        print("\n--- Search Results ---")
+        if not results:
+            print("No matching expenses.")
+            return False
+        pages = (len(results) + LIST_PAGE_SIZE - 1) // LIST_PAGE_SIZE
+        page = min(page, pages - 1)
+        offset = page * LIST_PAGE_SIZE
+        print(f"Matches: {len(results)} totalling {sum(e.amount for e in results):.2f} (page {page + 1} of {pages})")
+        print(f"{'No.':<5} {'Amount':<10} {'Description':<25} {'Category':<15} {'Payment':<15} {'Date':<10}")
+        print("-"*80)
+        for i, e in enumerate(results[offset:offset + LIST_PAGE_SIZE]):
+            print(f"{offset+i+1:<5} {e.amount:<10.2f} {e.description[:25]:<25} {self.category_names[e.category]:<15} {self.payment_method_names[e.payment_method]:<15} {calendar_day(e.date).text:<10}")
+        print("-"*80)
+        return offset + LIST_PAGE_SIZE < len(results)
+
+    def search_prompt(self):
+        """Expenses > Search: ask for the words and filters, then page through the matches"""
+        text = input("Search descriptions (Enter for any): ")
+        print("Filters - press Enter to skip any of them.")
+        try:
+            category = input("Category (name or number): ").strip()
+            category = resolve_choice(category, self.category_names, "category") if category else None
+            payment_method = input("Payment method (name or number): ").strip()
+            payment_method = resolve_choice(payment_method, self.payment_method_names, "payment method") if payment_method else None
+            min_amount = input("Minimum amount: ").strip()
+            max_amount = input("Maximum amount: ").strip()
+            start = input("From date (DD-MM-YYYY): ").strip()
+            end = input("To date (DD-MM-YYYY): ").strip()
+            results = self.search_expenses(
+                text, category, payment_method,
+                float(min_amount) if min_amount else None, float(max_amount) if max_amount else None,
+                parse_date(start) if start else None, parse_date(end).replace(hour=23, minute=59, second=59) if end else None
+            )
+        except ValueError as e:
+            print(f"Invalid input: {e}")
+            return
+        page_through(lambda page: self.show_search_results(results, page), "n = next page, p = previous page, Enter to go back: ")
+
+    @_needs("expenses")
+    def expense_count(self) -> int:
+        if self._db is not None:
+            return self._db.count()
+        return len(self._view)
+
+    @_needs("expenses")
+    def newest_expenses(self, limit, offset=0) -> List[Expense]:
+        """Up to `limit` expenses newest first, skipping the `offset` newest"""
+        return self._newest(limit, offset)
+
+    def _newest(self, limit, offset) -> List[Expense]:
+        """newest_expenses over the data as last loaded, without picking up other processes' changes"""
+        if self._db is not None:
+            return [Expense(*row) for row in self._db.newest(offset, limit)]
+        items = self._view.items
+        stop = max(0, len(items) - offset)
+        return items[max(0, stop - limit):stop][::-1]
+
+    @_needs("expenses", refresh=False)
+    def listed_expense(self, number) -> Optional[Expense]:
+        """The expense list_expenses shows as `number` (1 is the newest), or None"""
+        if number < 1:
+            return None
+        # Numbered against the view the listing was printed from; a refresh here could shift it
+        found = self._newest(1, number - 1)
+        return found[0] if found else None
+
+    @_needs("expenses")
+    def _list_counts(self) -> Tuple[int, int]:
+        """(main list length, memory length)"""
+        if self._db is not None:
+            return self._db.list_counts()
+        return len(self.expenses), len(self.memory)
+
+    @_needs("expenses")
+    def _list_pages(self, limit, offset) -> Tuple[List[Expense], List[Expense]]:
+        """Up to `limit` entries of the main list (oldest first) and of memory (newest first), skipping `offset`"""
+        if self._db is not None:
+            return ([Expense(*row) for row in self._db.main_list(limit, offset)],
+                    [Expense(*row) for row in self._db.memory_list(limit, offset)])
+        return self.expenses[offset:offset + limit], self.memory[offset:offset + limit]
+
+    @_needs("expenses")
+    def main_list_total(self) -> float:
+        if self._db is not None:
+            return self._db.main_total()
+        return sum(e.amount for e in self.expenses)
+
+    @_needs("balance", refresh=False)
     def save_balance(self):
-        with open(BALANCE_FILE, 'wb') as f:
-            pickle.dump({
-                'bank_balance': self.bank_balance,
-                'cash_balance': self.cash_balance,
-                'bank_history': self.bank_history,
-                'cash_history': self.cash_history
-            }, f)
+        if self._db is not None:
+            self._db.save_balance(
+                self.bank_balance, self.cash_balance,
+                [(h.amount, h.date) for h in self.bank_history],
+                [(h.amount, h.date) for h in self.cash_history]
+            )
+            return
+        # Copied now, while the state is consistent; written out in the background, merged with
+        # whatever another process saved since this one read the file
+        self._balance_file.save(self._writer, "balance", {
+            'bank_balance': self.bank_balance,
+            'cash_balance': self.cash_balance,
+            'bank_history': list(self.bank_history),
+            'cash_history': list(self.cash_history)
+        })
 
+    @diagnostics.timed("load_balance")
     def load_balance(self):
-        if os.path.exists(BALANCE_FILE):
-            with open(BALANCE_FILE, 'rb') as f:
-                data = pickle.load(f)
-                self.bank_balance = data.get('bank_balance', 0.0)
-                self.cash_balance = data.get('cash_balance', 0.0)
-                self.bank_history = data.get('bank_history', [])
-                self.cash_history = data.get('cash_history', [])
+        if self._db is not None:
+            data = self._db.load_balance()
+            self.bank_balance = data['bank_balance']
+            self.cash_balance = data['cash_balance']
+            self.bank_history = [BalanceEntry(*h) for h in data['bank_history']]
+            self.cash_history = [BalanceEntry(*h) for h in data['cash_history']]
+            return
+        data = self._balance_file.read()
+        self.bank_balance = data['bank_balance']
+        self.cash_balance = data['cash_balance']
+        self.bank_history = list(data['bank_history'])
+        self.cash_history = list(data['cash_history'])
 
     def save_categories(self):
-        with open(CATEGORY_FILE, 'w', encoding='utf-8') as f:
-            for cat in self.category_names:
-                f.write(cat + '\n')
+        self._data_version += 1
+        if self._db is not None:
+            self._db.save_categories(self.category_names)
+            return
+        self._category_file.save(self._writer, "categories", list(self.category_names))
 
     def load_categories(self):
-        if os.path.exists(CATEGORY_FILE):
-            with open(CATEGORY_FILE, 'r', encoding='utf-8') as f:
-                self.category_names = [line.strip() for line in f if line.strip()]
+        self._data_version += 1
+        if self._db is not None:
+            self.category_names = self._db.load_categories()
+        else:
+            self.category_names = list(self._category_file.read()) or self.category_names
         if not self.category_names:
             self.category_names = [
                 "Food & Groceries", "Transport", "Utilities", "Entertainment", "Shopping",
@@ -96,38 +1184,197 @@ class ExpenseTracker:
             ]
             self.save_categories()
 
+    def save_rules(self):
+        if self._db is not None:
+            self._db.set_meta('category_rules', _encode_rules(self.category_rules).decode('utf-8'))
+            return
+        self._rules_file.save(self._writer, "rules", list(self.category_rules))
+
+    def load_rules(self):
+        if self._db is not None:
+            saved = self._db.get_meta('category_rules')
+            self.category_rules = [categorize.Rule(**rule) for rule in json.loads(saved)] if saved else []
+        else:
+            self.category_rules = list(self._rules_file.read())
+
+    def _description_categories(self) -> Iterator[Tuple[str, int, int]]:
+        """(description, category, number of expenses) for every pairing in the history"""
+        if self._db is not None:
+            return iter(self._db.description_categories())
+        # Counted as pairs first: descriptions repeat, and learning reduces each one to its usual form
+        pairs = Counter((e.description, e.category) for e in self._view.items)
+        return ((description, category, n) for (description, category), n in pairs.items())
+
+    def _auto_categorizer(self) -> categorize.Categorizer:
+        """The category rules compiled into one pattern, with the history learned from the view the
+        first time it is needed and kept up to date by _link and _unlink; with the database,
+        learned again whenever the data has changed"""
+        if self._categorizer is None:
+            self._categorizer = categorize.Categorizer()
+            self._categorizer.relearn(self._description_categories())
+            self._categorizer_version = self._version()
+        elif self._db is not None and self._categorizer_version != self._version():
+            self._categorizer.relearn(self._description_categories())
+            self._categorizer_version = self._version()
+        # Recompiled only if the rules or category names changed
+        self._categorizer.use_rules(self.category_rules, self.category_names)
+        return self._categorizer
+
+    @_needs("expenses")
+    def suggest_category(self, description) -> Optional[int]:
+        """Category the rules give description or, failing them, the one the history mostly gave it; None if neither decides"""
+        return self._auto_categorizer().categorize(description)
+
+    def add_rule(self, pattern, category, regex=False):
+        """Add a rule sending descriptions that match pattern (a keyword, or a regular expression if regex) to category,
+        given by name or number; raises ValueError if it cannot be used"""
+        rule = categorize.Rule(pattern.strip(), self.category_names[resolve_choice(category, self.category_names, "category")], regex)
+        categorize.check_rule(rule, self.category_names)
+        if rule in self.category_rules:
+            raise ValueError("that rule already exists")
+        self.category_rules = self.category_rules + [rule]
+        self.save_rules()
+
+    def remove_rule(self, number) -> Optional[categorize.Rule]:
+        """Remove the rule show_rules numbers `number`; returns it, or None if there is no such rule"""
+        if not 1 <= number <= len(self.category_rules):
+            return None
+        rule = self.category_rules[number - 1]
+        self.category_rules = self.category_rules[:number - 1] + self.category_rules[number:]
+        self.save_rules()
+        return rule
+
+    def show_rules(self):
+        print("\n--- Category Rules ---")
+        if not self.category_rules:
+            print("No rules yet. Without rules, categories are suggested from the expense history.")
+            return
+        print(f"{'No.':<5} {'Kind':<8} {'Pattern':<35} {'Category':<20}")
+        print("-"*70)
+        for i, rule in enumerate(self.category_rules, 1):
+            missing = "" if rule.category in self.category_names else " (no such category)"
+            print(f"{i:<5} {'regex' if rule.regex else 'keyword':<8} {rule.pattern[:35]:<35} {rule.category}{missing}")
+        print("-"*70)
+        print("The rule matching earliest in a description decides it; at the same place, the one listed first.")
+
+    def explain_category(self, description):
+        """Print the category suggest_category gives description and what decided it"""
+        category = self.suggest_category(description)
+        rule = self._categorizer.rule_for(description)
+        if category is None:
+            print("No rule matches and the history does not decide it.")
+        elif rule is not None:
+            print(f"{self.category_names[category]} (rule {rule + 1}: {self.category_rules[rule].pattern})")
+        else:
+            print(f"{self.category_names[category]} (from earlier expenses like it)")
+
+    def rules_prompt(self):
+        """Settings > Category Rules: list, add, remove and try out rules"""
+        while True:
+            self.show_rules()
+            answer = input("a = add, d N = delete rule N, t = test a description, Enter to go back: ").strip().lower()
+            if answer == 'a':
+                pattern = input("Keyword or regular expression: ")
+                regex = input("Is it a regular expression? (y/n): ").strip().lower() == 'y'
+                for i, cat in enumerate(self.category_names):
+                    print(f"{i}: {cat}")
+                try:
+                    self.add_rule(pattern, input("Category: "), regex)
+                    print("Rule added.")
+                except ValueError as e:
+                    print(f"Rule not added: {e}")
+            elif answer.startswith('d'):
+                try:
+                    rule = self.remove_rule(int(answer[1:]))
+                except ValueError:
+                    rule = None
+                print(f"Rule '{rule.pattern}' deleted." if rule else "No such rule.")
+            elif answer == 't':
+                self.explain_category(input("Description: "))
+            else:
+                return
+
+    @_needs("expenses")
     def fix_timestamps(self):
         """Fix timestamp issues in existing data"""
         current_date = datetime.now().date()
         fixed_count = 0
+        if self._db is not None:
+            today = datetime.combine(current_date, datetime.min.time())
+            fixed_count = self._db.shift_dates((today - timedelta(days=1)).timestamp(), today.timestamp(), 24 * 60 * 60)
+            if fixed_count > 0:
+                print(f"Fixed {fixed_count} timestamp(s) to show correct dates.")
+            return
+        # Expenses are adjusted in place below, which a running compaction must not see
+        self._wait_for_compaction()
+        with self._committing():
+            # Fix timestamps in expenses list
+            for expense in self.expenses:
+                dt = calendar_day(expense.date).dt
+                # If the expense date is showing as yesterday but should be today,
+                # adjust the timestamp by adding 24 hours
+                if dt.date() == current_date - timedelta(days=1):
+                    expense.date += 24 * 60 * 60  # 24 hours in seconds
+                    fixed_count += 1
         
-        # Fix timestamps in expenses list
-        for expense in self.expenses:
-            dt = datetime.fromtimestamp(expense.date)
-            # If the expense date is showing as yesterday but should be today,
-            # adjust the timestamp by adding 24 hours
-            if dt.date() == current_date - timedelta(days=1):
-                expense.date += 24 * 60 * 60  # 24 hours in seconds
-                fixed_count += 1
-        
-        # Fix timestamps in memory list
-        for expense in self.memory:
-            dt = datetime.fromtimestamp(expense.date)
-            # If the expense date is showing as yesterday but should be today,
-            # adjust the timestamp by adding 24 hours
-            if dt.date() == current_date - timedelta(days=1):
-                expense.date += 24 * 60 * 60  # 24 hours in seconds
-                fixed_count += 1
+            # Fix timestamps in memory list
+            for expense in self.memory:
+                dt = calendar_day(expense.date).dt
+                # If the expense date is showing as yesterday but should be today,
+                # adjust the timestamp by adding 24 hours
+                if dt.date() == current_date - timedelta(days=1):
+                    expense.date += 24 * 60 * 60  # 24 hours in seconds
+                    fixed_count += 1
         
-        if fixed_count > 0:
-            self.save_expenses()
-            print(f"Fixed {fixed_count} timestamp(s) to show correct dates.")
+            if fixed_count > 0:
+                self._rebuild_index()
+                self.save_expenses()
+                print(f"Fixed {fixed_count} timestamp(s) to show correct dates.")
 
+    @diagnostics.timed("init_tracker")
     def init_tracker(self):
+        """Open the tracker; the expense lists and balances are loaded when first needed.
+        Categories are loaded now: they are a few lines and nearly every screen shows them."""
+        if self.storage == "sqlite":
+            self._open_database()
+        self.load_categories()
+        self.load_rules()
+        self._deferred = {"expenses", "balance"}
+        # Removed automatic fix_timestamps() call to preserve user-entered dates
+
+    def _load_deferred(self, datasets):
+        for name in datasets:
+            if name in self._deferred:
+                # Still deferred if loading fails, so nothing is saved over the unread file
+                getattr(self, f"load_{name}")()
+                self._deferred.discard(name)
+
+    def _open_database(self):
+        from sqlite_store import SQLiteStorage
+        self._db = SQLiteStorage(DB_FILE, MAX_MEMORY)
+        if self._db.get_meta('migrated') is None:
+            if any(os.path.exists(f) for f in (CURRENT_FILE, MEMORY_FILE, JOURNAL_FILE, LEGACY_CURRENT_FILE, LEGACY_MEMORY_FILE)):
+                self._migrate_to_database()
+            self._db.set_meta('migrated', datetime.now().isoformat())
+
+    def _migrate_to_database(self):
+        """Copy the saved expense lists, balances and categories into a new database"""
+        db, self._db = self._db, None
         self.load_categories()
+        self.load_rules()
         self.load_expenses()
         self.load_balance()
-        # Removed automatic fix_timestamps() call to preserve user-entered dates
+        self._db = db
+        memory_seq = {id(e): len(self.memory) - i for i, e in enumerate(self.memory)}
+        rows = [expense_key(e) + (1, memory_seq.get(id(e))) for e in self.expenses]
+        rows += [expense_key(e) + (0, memory_seq[id(e)]) for e in self.memory if self._refs[id(e)] == 1]
+        db.insert_rows(rows)
+        self.save_categories()
+        self.save_rules()
+        self.save_balance()
+        self.expenses, self.memory = [], []
+        self._rebuild_index()
+        print(f"Moved {len(rows)} expenses into {DB_FILE}.")
 
     def is_duplicate(self, e1: Expense, e2: Expense) -> bool:
         return (
@@ -149,53 +1396,204 @@ class ExpenseTracker:
         self.save_categories()
         print(f"Category '{name}' added successfully.")
 
-    def add_expense(self, amount, desc, category, payment_method, date):
+    @diagnostics.timed("add_expense")
+    @_needs("expenses")
+    def add_expense(self, amount, desc, category, payment_method, date) -> bool:
         # More lenient validation - only check essential conditions
         if amount <= 0:
             print("Error: Amount must be greater than 0.")
-            return
+            return False
         if not desc or not desc.strip():
             print("Error: Description cannot be empty.")
-            return
+            return False
         if category < 0 or category >= len(self.category_names):
             print(f"Error: Category must be between 0 and {len(self.category_names)-1}.")
-            return
+            return False
         if payment_method < 0 or payment_method >= len(self.payment_method_names):
             print(f"Error: Payment method must be between 0 and {len(self.payment_method_names)-1}.")
-            return
+            return False
         
         # Check if we're approaching limits (warn but don't block)
-        if len(self.expenses) >= MAX_EXPENSES:
+        if self._list_counts()[0] >= MAX_EXPENSES:
             print(f"Warning: Maximum expenses limit ({MAX_EXPENSES}) reached. Consider clearing old entries.")
         
-        expense = Expense(amount, desc.strip(), category, payment_method, date)
+        self._add(Expense(amount, desc.strip(), category, payment_method, date))
+        print(f"✓ Expense added successfully: {desc.strip()} - {amount:.2f}")
+        return True
+
+    @_needs("expenses", refresh=False)
+    def _add(self, expense: Expense):
+        """Record an already validated expense in the main list and at the front of memory"""
+        if self._db is not None:
+            self._db.add(expense_key(expense))
+            return
+        with self._committing():
+            self._journal({'op': 'add', 'expense': expense_key(expense)})
+            self._insert(expense)
+
+    def _insert(self, expense: Expense):
         self.expenses.append(expense)
+        self._link(expense)
         # Add to memory (front)
         self.memory.insert(0, expense)
+        self._link(expense)
         if len(self.memory) > MAX_MEMORY:
+            for e in self.memory[MAX_MEMORY:]:
+                self._unlink(e)
             self.memory = self.memory[:MAX_MEMORY]
-        self.save_expenses()
-        print(f"✓ Expense added successfully: {desc.strip()} - {amount:.2f}")
 
+    def _parse_import_row(self, row, default_category, default_payment, guess=None) -> Expense:
+        """Build an Expense from a statement row, raising ValueError with the reason it is invalid.
+        A row without a category takes guess(description) if guess is given and decides it, else default_category."""
+        try:
+            amount = float(str(row['amount']).replace(',', ''))
+        except (KeyError, ValueError):
+            raise ValueError(f"invalid amount '{row.get('amount', '')}'")
+        if amount <= 0:
+            raise ValueError("amount must be greater than 0")
+        desc = str(row.get('description') or '').strip()[:MAX_DESC]
+        if not desc:
+            raise ValueError("description is empty")
+        if 'date' not in row:
+            raise ValueError("date is missing")
+        # 0 is a valid index, so only a missing or blank value takes the default
+        category, payment_method = (str(row.get(k) if row.get(k) is not None else '').strip()
+                                    for k in ('category', 'payment_method'))
+        guessed = guess(desc) if guess is not None and not category else None
+        category = guessed if guessed is not None else resolve_choice(category or default_category, self.category_names, "category")
+        payment_method = resolve_choice(payment_method or default_payment, self.payment_method_names, "payment method")
+        return Expense(amount, desc, category, payment_method, parse_date(str(row['date'])).timestamp())
+
+    @diagnostics.timed("import_statement")
+    @_needs("expenses")
+    def import_statement(self, rows: Iterable[dict], default_category=None, default_payment="Card"):
+        """Add statement rows as expenses, skipping invalid rows and ones already recorded.
+        Rows without a category get default_category or, if that is None, the one suggest_category
+        gives them, else Miscellaneous. Rows are checked in batches against the identity index and
+        committed together at the end. Returns (added, duplicates, rejected) where rejected lists
+        (row number, reason)."""
+        # One compiled matcher for the whole import, so each row costs a single pass over its description
+        guess = self._auto_categorizer().categorize if default_category is None else None
+        default_category = default_category or "Miscellaneous"
+        new, rejected, duplicates = [], [], 0
+        seen = set()
+        numbered = enumerate(rows, 1)
+        while True:
+            batch = list(itertools.islice(numbered, IMPORT_BATCH_SIZE))
+            if not batch:
+                break
+            parsed = []
+            for number, row in batch:
+                try:
+                    parsed.append(self._parse_import_row(row, default_category, default_payment, guess))
+                except ValueError as e:
+                    rejected.append((number, str(e)))
+            if not parsed:
+                continue
+            if self._db is not None:
+                existing = self._db.keys_between(min(e.date for e in parsed), max(e.date for e in parsed))
+            else:
+                existing = self._index
+            for e in parsed:
+                key = expense_key(e)
+                if key in existing or key in seen:
+                    duplicates += 1
+                    continue
+                seen.add(key)
+                new.append(e)
+        if new:
+            self._add_many(new)
+        return len(new), duplicates, rejected
+
+    @_needs("expenses", refresh=False)
+    def _add_many(self, new: List[Expense]):
+        """add_expense for many expenses in order, written to disk once"""
+        if self._db is not None:
+            self._db.add_many([expense_key(e) for e in new])
+            return
+        self._wait_for_compaction()
+        with self._committing():
+            self.expenses.extend(new)
+            self.memory[:0] = new[::-1]
+            del self.memory[MAX_MEMORY:]
+            self._rebuild_index()
+            self.save_expenses()
+
+    @diagnostics.timed("remove_expense")
+    @_needs("expenses")
     def remove_expense(self, expense: Expense):
-        removed = False
-        # Remove from both lists
-        for lst, fname in [(self.expenses, CURRENT_FILE), (self.memory, MEMORY_FILE)]:
-            idx_to_remove = None
-            for i, e in enumerate(lst):
-                if self.is_duplicate(e, expense):
-                    idx_to_remove = i
-                    break
-            if idx_to_remove is not None:
-                lst.pop(idx_to_remove)
-                removed = True
-            with open(fname, 'wb') as f:
-                pickle.dump(lst, f)
-        if removed:
+        if self._remove(expense):
             print("Entry deleted successfully from relevant lists.")
         else:
             print("Entry not found in any list for deletion.")
 
+    @_needs("expenses", refresh=False)
+    def _remove(self, expense: Expense) -> bool:
+        """Delete expense (or, failing the very object, one equal to it) from both lists; False if there is none"""
+        if self._db is not None:
+            return self._db.remove(expense_key(expense))
+        with self._committing():
+            bucket = self._index.get(expense_key(expense))
+            if not bucket:
+                return False
+            # Prefer the very object picked from a listing; any duplicate will do otherwise
+            target = expense if _position(bucket, expense) is not None else bucket[0]
+            self._journal({'op': 'delete', 'expense': expense_key(expense)})
+            self._delete(target)
+            return True
+
+    def _delete(self, target: Expense):
+        # Remove from both lists
+        for lst in (self.expenses, self.memory):
+            idx_to_remove = _position(lst, target)
+            if idx_to_remove is not None:
+                lst.pop(idx_to_remove)
+                self._unlink(target)
+
+    @_needs("expenses", refresh=False)
+    def _replace(self, old: Expense, new: Expense) -> List[str]:
+        """Put new in place of old in every list holding it; returns the names of the lists changed.
+        old is matched by identity in memory, and by its fields with the SQLite engine."""
+        if self._db is not None:
+            if self.is_duplicate(new, old) or self._db.replace(expense_key(old), expense_key(new)):
+                return ["expenses"]
+            return []
+        with self._committing():
+            if _position(self.expenses, old) is None and _position(self.memory, old) is None:
+                # Reloaded since it was picked: an expense with its fields is the same one, and
+                # if none is left another process deleted or edited it
+                bucket = self._index.get(expense_key(old))
+                if not bucket:
+                    return []
+                old = bucket[0]
+            if not self.is_duplicate(new, old):
+                self._journal({'op': 'edit', 'old': expense_key(old), 'new': expense_key(new)})
+            return self._swap(old, new)
+
+    def _swap(self, old: Expense, new: Expense) -> List[str]:
+        changed = []
+        # The edited expense keeps its place in the insertion order, as it keeps its list slots
+        rank = self._ranks.get(id(old))
+        # Both lists share one object per expense, so it is found by identity
+        for name, lst in (("expenses", self.expenses), ("memory", self.memory)):
+            i = _position(lst, old)
+            if i is not None:
+                lst[i] = new
+                self._unlink(old)
+                self._link(new, rank)
+                changed.append(name)
+        return changed
+
+    @_needs("expenses")
+    def find_expense(self, key) -> Optional[Expense]:
+        """A recorded expense whose fields are key (as expense_key gives them), or None"""
+        key = tuple(key)
+        if self._db is not None:
+            return Expense(*key) if key in self._db.keys_between(key[4], key[4]) else None
+        bucket = self._index.get(key)
+        return bucket[0] if bucket else None
+
+    @_needs("expenses", refresh=False)
     def edit_expense(self, idx, is_memory):
         lst = self.memory if is_memory else self.expenses
         list_name = "memory" if is_memory else "expenses"
@@ -204,16 +1602,38 @@ class ExpenseTracker:
             print("Invalid index.")
             return
             
-        exp = lst[idx]
-        old_exp = Expense(**vars(exp))
+        old_exp = lst[idx]
+        exp = self._prompt_edit(old_exp, list_name)
+        if exp is None:
+            return
+        
+        # Updates the corresponding entry in the other list too, and saves the change
+        other_list_name = "expenses" if is_memory else "memory"
+        changed = self._replace(old_exp, exp)
+        if not changed:
+            print("This expense was changed or deleted in another session meanwhile. Nothing saved.")
+            return
+        updated_in_other = other_list_name in changed
+        
+        print("\n--- Edit Summary ---")
+        print(f"✓ Expense updated in {list_name.title()} list")
+        if updated_in_other:
+            print(f"✓ Expense synchronized in {other_list_name.title()} list")
+        else:
+            print(f"ℹ No duplicate found in {other_list_name.title()} list (this is normal)")
+        print("✓ All changes saved successfully!")
+
+    def _prompt_edit(self, old_exp, list_name) -> Optional[Expense]:
+        """Ask for each field of old_exp in turn; returns the edited copy, or None if cancelled"""
+        # Edit a copy and swap it in at the end so a cancelled edit leaves nothing half-changed
+        exp = old_exp.copy()
         
         print(f"\n--- Editing Expense ---")
         print(f"Description: {exp.description}")
         print(f"Amount: {exp.amount:.2f}")
         print(f"Category: {self.category_names[exp.category]}")
         print(f"Payment Method: {self.payment_method_names[exp.payment_method]}")
-        dt = datetime.fromtimestamp(exp.date)
-        print(f"Date: {dt.strftime('%d-%m-%Y')}")
+        print(f"Date: {calendar_day(exp.date).text}")
         print(f"List: {list_name.title()}")
         print("-" * 40)
         
@@ -267,8 +1687,7 @@ class ExpenseTracker:
                     print("✗ Invalid input. Keeping current payment method.")
             
             # Edit date
-            dt = datetime.fromtimestamp(exp.date)
-            val = input(f"Current date: {dt.strftime('%d-%m-%Y')}\nChange date? (y/n): ")
+            val = input(f"Current date: {calendar_day(exp.date).text}\nChange date? (y/n): ")
             if val.strip().lower() == 'y':
                 val = input("Enter new date (DD MM YYYY): ")
                 try:
@@ -281,85 +1700,75 @@ class ExpenseTracker:
                     
         except Exception as e:
             print(f"Edit cancelled due to error: {e}")
+            return None
+        return exp
+
+    @_needs("expenses", refresh=False)
+    def edit_selected(self, expense):
+        """Edit an expense picked by its number in list_expenses"""
+        if self._db is not None:
+            exp = self._prompt_edit(expense, "expenses")
+            if exp is None:
+                return
+            self._replace(expense, exp)
+            print("\n--- Edit Summary ---")
+            print("✓ Expense updated")
+            print("✓ All changes saved successfully!")
             return
-        
-        # Update the corresponding entry in the other list for synchronization
-        other_lst = self.expenses if is_memory else self.memory
-        other_list_name = "expenses" if is_memory else "memory"
-        updated_in_other = False
-        
-        for i, e in enumerate(other_lst):
-            if self.is_duplicate(e, old_exp):
-                # Update the entry to match the edited expense
-                other_lst[i] = Expense(**vars(exp))
-                updated_in_other = True
-                break
-        
-        # Save changes
-        self.save_expenses()
-        
-        print("\n--- Edit Summary ---")
-        print(f"✓ Expense updated in {list_name.title()} list")
-        if updated_in_other:
-            print(f"✓ Expense synchronized in {other_list_name.title()} list")
+        # Find which list this expense belongs to and edit accordingly
+        expense_idx = _position(self.expenses, expense)
+        if expense_idx is not None:
+            print(f"Found in main expenses list at index {expense_idx}")
+            self.edit_expense(expense_idx, False)
+        elif _position(self.memory, expense) is not None:
+            expense_idx = _position(self.memory, expense)
+            print(f"Found in memory list at index {expense_idx}")
+            self.edit_expense(expense_idx, True)
         else:
-            print(f"ℹ No duplicate found in {other_list_name.title()} list (this is normal)")
-        print("✓ All changes saved successfully!")
+            print("Error: Expense not found in any list.")
 
-    def list_expenses(self):
+    @diagnostics.timed("list_expenses")
+    @_needs("expenses")
+    def list_expenses(self, page=0) -> bool:
+        """Show one page of expenses, newest first; returns True if there are older pages"""
         print("\n--- Listed Expenses ---")
         
-        # Combine all expenses: memory first (most recent), then main expenses
-        # Remove duplicates by checking if expense from main list already exists in memory
-        all_exp = []
-        
-        # Add all memory expenses first (they are the most recent)
-        for expense in self.memory:
-            all_exp.append(expense)
+        # Main and memory expenses merged without duplicates, kept sorted as they change
+        count = self.expense_count()
         
-        # Add main expenses that are not duplicates of memory expenses
-        for expense in self.expenses:
-            is_duplicate = False
-            for mem_expense in self.memory:
-                if self.is_duplicate(expense, mem_expense):
-                    is_duplicate = True
-                    break
-            if not is_duplicate:
-                all_exp.append(expense)
-        
-        # Sort by date from newest to oldest
-        all_exp = sorted(all_exp, key=lambda e: -e.date)
-        
-        if not all_exp:
+        if not count:
             print("No expenses to display.")
-            return
+            return False
         
-        print(f"Total expenses: {len(all_exp)}")
+        pages = (count + LIST_PAGE_SIZE - 1) // LIST_PAGE_SIZE
+        page = min(page, pages - 1)
+        offset = page * LIST_PAGE_SIZE
+        print(f"Total expenses: {count} (page {page + 1} of {pages})")
         print(f"{'No.':<5} {'Amount':<10} {'Description':<25} {'Category':<15} {'Payment':<15} {'Date':<10}")
         print("-"*80)
         
-        # Show up to 50 entries instead of 30
-        for i, e in enumerate(all_exp[:50]):
-            dt = datetime.fromtimestamp(e.date)
-            print(f"{i+1:<5} {e.amount:<10.2f} {e.description[:25]:<25} {self.category_names[e.category]:<15} {self.payment_method_names[e.payment_method]:<15} {dt.strftime('%d-%m-%Y'):<10}")
+        # Only this page is fetched; numbers run on across pages so they match listed_expense
+        for i, e in enumerate(self.newest_expenses(LIST_PAGE_SIZE, offset)):
+            print(f"{offset+i+1:<5} {e.amount:<10.2f} {e.description[:25]:<25} {self.category_names[e.category]:<15} {self.payment_method_names[e.payment_method]:<15} {calendar_day(e.date).text:<10}")
         
-        if len(all_exp) > 50:
-            print(f"... and {len(all_exp) - 50} more entries")
+        remaining = count - offset - LIST_PAGE_SIZE
+        if remaining > 0:
+            print(f"... and {remaining} more entries")
         
         print("-"*80)
+        return remaining > 0
 
-    def category_summary(self):
-        now = datetime.now()
-        month, year = now.month, now.year
-        all_exp = self.expenses + [e for e in self.memory if not any(self.is_duplicate(e, c) for c in self.expenses)]
-        month_exp = [e for e in all_exp if datetime.fromtimestamp(e.date).month == month and datetime.fromtimestamp(e.date).year == year]
-        if not month_exp:
-            print("No expenses found for the current month.")
+    @diagnostics.timed("category_summary")
+    def category_summary(self, year=None, month=None):
+        if year is None:
+            now = datetime.now()
+            month, year = now.month, now.year
+        totals = self._month_totals(year, month)
+        if not totals:
+            print(f"No expenses found for {MONTH_NAMES[month-1]} {year}.")
             return
-        cat_totals = [0.0]*len(self.category_names)
-        for e in month_exp:
-            cat_totals[e.category] += e.amount
-        total = sum(cat_totals)
+        cat_totals = totals.category_totals
+        total = totals.total
         print(f"{'Category':<20} {'Total':<15} {'%':<10}")
         print("-"*45)
         for i, amt in enumerate(cat_totals):
@@ -368,24 +1777,78 @@ class ExpenseTracker:
         print("-"*45)
         print(f"{'TOTAL MONTHLY':<20} {total:<15.2f} {100.00:<9.2f}%")
 
-    def find_highest_expense(self):
-        now = datetime.now()
-        month, year = now.month, now.year
-        all_exp = self.expenses + [e for e in self.memory if not any(self.is_duplicate(e, c) for c in self.expenses)]
-        month_exp = [e for e in all_exp if datetime.fromtimestamp(e.date).month == month and datetime.fromtimestamp(e.date).year == year]
-        if not month_exp:
+    @diagnostics.timed("find_highest_expense")
+    def find_highest_expense(self, year=None, month=None):
+        if year is None:
+            now = datetime.now()
+            month, year = now.month, now.year
+        totals = self._month_totals(year, month)
+        if not totals:
             print("No expenses found for this month.")
             return
-        highest = max(month_exp, key=lambda e: e.amount)
-        dt = datetime.fromtimestamp(highest.date)
-        print(f"Amount: {highest.amount}\nDescription: {highest.description}\nCategory: {self.category_names[highest.category]}\nPayment Method: {self.payment_method_names[highest.payment_method]}\nDate: {dt.strftime('%d-%m-%Y')}")
+        highest = totals.highest
+        print(f"Amount: {highest.amount}\nDescription: {highest.description}\nCategory: {self.category_names[highest.category]}\nPayment Method: {self.payment_method_names[highest.payment_method]}\nDate: {calendar_day(highest.date).text}")
+
+    @diagnostics.timed("recurring_expenses")
+    @_needs("expenses")
+    def recurring_expenses(self, as_of=None) -> List[recurring.Series]:
+        """Recurring series found in the RECURRING_LOOKBACK_DAYS up to as_of (default: today) that
+        are still running then, most expensive first; kept until the data changes"""
+        day = (as_of or datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+        return self._cached(('recurring', day.timestamp()), lambda: self._detect_recurring(day))
+
+    def _detect_recurring(self, day) -> List[recurring.Series]:
+        end = day + timedelta(days=1, microseconds=-1)
+        rows = self.expenses_between(day - timedelta(days=RECURRING_LOOKBACK_DAYS), end)
+        diagnostics.count("recurring.rows_scanned", len(rows))
+        return [s for s in recurring.detect(rows) if s.active(day.timestamp())]
+
+    def month_forecast(self, year, month, as_of=None) -> MonthForecast:
+        """Where the month's total is heading as of as_of (default: now): what is recorded, the
+        recurring expenses still expected, and the other spending going on at its pace so far"""
+        now = as_of or datetime.now()
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        start_ts, stop_ts = _month_bounds(year, month)
+        totals = self._month_totals(year, month)
+        spent = totals.total if totals else 0.0
+        if stop_ts <= today.timestamp():
+            return MonthForecast(spent, 0.0, 0.0, 0, [])
+        series = self.recurring_expenses(now)
+        # Expected occurrences after each series' last recorded one, including any a few days late
+        upcoming = sorted(((ts, s) for s in series for ts in s.due_between(start_ts, stop_ts)),
+                          key=lambda pair: pair[0])
+        first = datetime.fromtimestamp(start_ts)
+        days_left = (datetime.fromtimestamp(stop_ts) - max(today + timedelta(days=1), first)).days
+        daily_rate = 0.0
+        if today >= first:
+            recurring_spent = sum(e.amount for s in series for e in s.expenses if e.date >= start_ts)
+            daily_rate = max(spent - recurring_spent, 0.0) / ((today - first).days + 1)
+        return MonthForecast(spent, sum(s.amount for _, s in upcoming), daily_rate, days_left, upcoming)
+
+    def show_recurring(self):
+        series = self.recurring_expenses()
+        if not series:
+            print("No recurring expenses found.")
+            return
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        horizon = (today + timedelta(days=RECURRING_HORIZON_DAYS)).timestamp()
+        due = 0.0
+        print(f"{'Description':<30} {'Category':<15} {'Every':<12} {'Amount':<10} {'Times':<6} {'Next due':<10}")
+        print("-"*88)
+        for s in series:
+            due += s.amount * len(s.due_between(0, horizon))
+            print(f"{s.description[:30]:<30} {self.category_names[s.category][:15]:<15} {s.cadence:<12} "
+                  f"{s.amount:<10.2f} {len(s.expenses):<6} {calendar_day(s.next_date).text:<10}")
+        print("-"*88)
+        print(f"Expected in the next {RECURRING_HORIZON_DAYS} days: {due:.2f}")
 
-    def budget_alert(self, budget):
-        now = datetime.now()
-        month, year = now.month, now.year
-        all_exp = self.expenses + [e for e in self.memory if not any(self.is_duplicate(e, c) for c in self.expenses)]
-        month_exp = [e for e in all_exp if datetime.fromtimestamp(e.date).month == month and datetime.fromtimestamp(e.date).year == year]
-        total = sum(e.amount for e in month_exp)
+    @diagnostics.timed("budget_alert")
+    def budget_alert(self, budget, year=None, month=None):
+        if year is None:
+            now = datetime.now()
+            month, year = now.month, now.year
+        totals = self._month_totals(year, month)
+        total = totals.total if totals else 0.0
         print(f"\n--- Monthly Budget Analysis ---\nMonth: {MONTH_NAMES[month-1]} {year}\nBudget: {budget:.2f}\nExpenses: {total:.2f}\nRemaining: {budget-total:.2f}\nPercentage Used: {total/budget*100 if budget else 0:.2f}%")
         if total > budget:
             print(f"\nALERT: You have exceeded your monthly budget by {total-budget:.2f}!")
@@ -393,6 +1856,17 @@ class ExpenseTracker:
             print(f"\nWARNING: You have used {total/budget*100:.2f}% of your budget. Be careful with your spending.")
         else:
             print(f"\nYou still have {(budget-total)/budget*100 if budget else 0:.2f}% of your budget remaining.")
+        forecast = self.month_forecast(year, month)
+        if not forecast.days_left and not forecast.upcoming:
+            return
+        print(f"\nForecast for the month end: {forecast.projected:.2f}")
+        print(f"  Recurring still expected: {forecast.recurring_due:.2f}")
+        for ts, s in forecast.upcoming:
+            print(f"    {calendar_day(ts).text}  {s.description[:30]:<30} {s.amount:.2f}")
+        print(f"  Other spending at {forecast.daily_rate:.2f} a day for {forecast.days_left} more day(s): "
+              f"{forecast.daily_rate * forecast.days_left:.2f}")
+        if total <= budget < forecast.projected:
+            print(f"\nFORECAST: At this pace you will exceed your budget by {forecast.projected-budget:.2f} by the month end.")
 
     def view_monthly_total_expenses(self):
         try:
@@ -404,144 +1878,241 @@ class ExpenseTracker:
         except:
             print("Invalid input format.")
             return
-        all_exp = self.expenses + [e for e in self.memory if not any(self.is_duplicate(e, c) for c in self.expenses)]
-        month_exp = [e for e in all_exp if datetime.fromtimestamp(e.date).month == month and datetime.fromtimestamp(e.date).year == year]
-        total = sum(e.amount for e in month_exp)
-        if month_exp:
+        totals = self._month_totals(year, month)
+        if totals:
+            total = totals.total
             print(f"Total expenses for {MONTH_NAMES[month-1]} {year}: {total:.2f}")
         else:
             print(f"No expenses found for {MONTH_NAMES[month-1]} {year}.")
 
-    def export_to_excel(self, year, month):
+    def _export_dir(self):
         # Use default downloads folder
         downloads_path = os.path.expanduser("~/Downloads")
         export_dir = os.path.join(downloads_path, "Expense Reports")
         os.makedirs(export_dir, exist_ok=True)
-        all_exp = self.expenses + [e for e in self.memory if not any(self.is_duplicate(e, c) for c in self.expenses)]
-        month_exp = [e for e in all_exp if datetime.fromtimestamp(e.date).month == month and datetime.fromtimestamp(e.date).year == year]
-        if not month_exp:
-            print(f"No data found for {MONTH_NAMES[month-1]} {year}. Report not generated.")
-            return
-        filename = f"expense_report_{month:02d}-{year}.csv"
-        filepath = os.path.join(export_dir, filename)
-        # --- Analysis Section ---
+        return export_dir
+
+    def _newest_between(self, start_ts, stop_ts) -> Iterator[Tuple[int, Expense]]:
+        """(insertion rank, expense) for expenses dated start_ts <= date < stop_ts, newest first
+        and in insertion order among equal dates, one at a time"""
+        if self._db is not None:
+            return ((row[0], Expense(*row[1:])) for row in self._db.iter_newest(start_ts, stop_ts))
+        ranks = self._ranks
+        # Ranks are distinct, so sorting the pairs never compares the expenses themselves
+        return itertools.chain.from_iterable(sorted([(ranks[id(e)], e) for e in run])
+                                             for run in self._view.newest_runs(start_ts, stop_ts))
+
+    def _tallied(self, rows: Iterable[Tuple[int, Expense]], totals: PeriodTotals) -> Iterator[Expense]:
+        """Pass the expenses of (rank, expense) rows through, folding each into totals on the way;
+        of equal highest expenses, the lowest rank wins"""
+        top, top_rank = 0.0, None
+        for rank, e in rows:
+            totals.add(e)
+            if top_rank is None or e.amount > top or (e.amount == top and rank < top_rank):
+                totals.highest, top, top_rank = e, e.amount, rank
+            yield e
+
+    @diagnostics.timed("export")
+    @_needs("expenses")
+    def _export_period(self, stem, title, start_ts, stop_ts, fmt, cache_key=None) -> Optional[Tuple[str, PeriodTotals]]:
+        """Export expenses dated start_ts <= date < stop_ts as stem.csv or stem.xlsx in one pass over
+        the data: rows stream to the file as the totals build up, and the summaries go last.
+        Returns the file's path and the period's totals, or None (writing nothing) if it has no expenses."""
+        version = self._version()
+        rows = self._newest_between(start_ts, stop_ts)
+        first = next(rows, None)
+        if first is None:
+            return None
+        totals = PeriodTotals(0, 0.0, [0.0]*len(self.category_names), [0.0]*len(self.payment_method_names), None)
+        filepath = os.path.join(self._export_dir(), f"{stem}.{fmt}")
+        write = self._write_xlsx if fmt == "xlsx" else self._write_csv
+        write(filepath, title, self._tallied(itertools.chain([first], rows), totals), totals)
+        diagnostics.count("export.rows", totals.count)
+        if cache_key is not None:
+            # The pass that wrote the file already summed the period, so reports can reuse it
+            self._remember(cache_key, totals, version)
+        return filepath, totals
+
+    def _write_csv(self, filepath, title, rows, totals):
+        import csv
         export_time = datetime.now().strftime('%d-%m-%Y %H:%M:%S')
-        total = sum(e.amount for e in month_exp)
-        # Category-wise totals
-        cat_totals = [0.0]*len(self.category_names)
-        for e in month_exp:
-            cat_totals[e.category] += e.amount
-        # Payment method totals
-        pm_totals = [0.0]*len(self.payment_method_names)
-        for e in month_exp:
-            pm_totals[e.payment_method] += e.amount
-        # Highest expense
-        highest = max(month_exp, key=lambda e: e.amount)
-        highest_dt = datetime.fromtimestamp(highest.date)
-        # --- Write to CSV ---
         with open(filepath, 'w', newline='', encoding='utf-8') as f:
             writer = csv.writer(f)
             writer.writerow(["SEP=,"])
-            writer.writerow([f"Expense Analysis for {MONTH_NAMES[month-1]} {year}"])
+            writer.writerow([title])
             writer.writerow([f"Exported on: {export_time}"])
             writer.writerow([])
             writer.writerow(["Detailed Expenses"])
             writer.writerow(["Index","Date","Amount","Description","Category","Payment Method","Day of Week","Month","Year"])
-            for i, e in enumerate(sorted(month_exp, key=lambda e: -e.date)):
-                # Use UTC to avoid timezone issues
-                dt = datetime.fromtimestamp(e.date)
+            for i, e in enumerate(rows):
+                day = calendar_day(e.date)
                 writer.writerow([
-                    i+1, dt.strftime('%d-%m-%Y'), f"{e.amount:.2f}", e.description, self.category_names[e.category],
-                    self.payment_method_names[e.payment_method], WEEKDAYS[dt.weekday()], MONTH_NAMES[dt.month-1], dt.year
+                    i+1, day.text, f"{e.amount:.2f}", e.description, self.category_names[e.category],
+                    self.payment_method_names[e.payment_method], day.weekday_name, day.month_name, day.year
                 ])
+            # rows is used up, so totals now covers the whole period
+            total = totals.total
             writer.writerow([])
             writer.writerow(["Total Expenses", f"{total:.2f}"])
             writer.writerow([])
             writer.writerow(["Category-wise Totals"])
             writer.writerow(["Category", "Total", "% of Total"])
-            for i, amt in enumerate(cat_totals):
+            for i, amt in enumerate(totals.category_totals):
                 if amt > 0:
                     writer.writerow([self.category_names[i], f"{amt:.2f}", f"{amt/total*100:.2f}%"])
             writer.writerow([])
             writer.writerow(["Payment Method Totals"])
             writer.writerow(["Payment Method", "Total"])
-            for i, amt in enumerate(pm_totals):
+            for i, amt in enumerate(totals.payment_totals):
                 if amt > 0:
                     writer.writerow([self.payment_method_names[i], f"{amt:.2f}"])
+            highest = totals.highest
             writer.writerow([])
             writer.writerow(["Highest Expense"])
             writer.writerow(["Amount", "Description", "Category", "Payment Method", "Date"])
             writer.writerow([
                 f"{highest.amount:.2f}", highest.description, self.category_names[highest.category],
-                self.payment_method_names[highest.payment_method], highest_dt.strftime('%d-%m-%Y')
+                self.payment_method_names[highest.payment_method], calendar_day(highest.date).text
             ])
-        print(f"Expense Report is generated with filename: {filepath}")
 
-    def export_to_excel_date_range(self, start_date, end_date):
-        # Use default downloads folder
-        downloads_path = os.path.expanduser("~/Downloads")
-        export_dir = os.path.join(downloads_path, "Expense Reports")
-        os.makedirs(export_dir, exist_ok=True)
-        all_exp = self.expenses + [e for e in self.memory if not any(self.is_duplicate(e, c) for c in self.expenses)]
-        range_exp = [e for e in all_exp if start_date <= datetime.fromtimestamp(e.date) <= end_date]
-        if not range_exp:
+    def _write_xlsx(self, filepath, title, rows, totals):
+        """Same content as the CSV, one sheet per section, through a write-only workbook that
+        streams each sheet to disk instead of keeping its cells in memory"""
+        openpyxl = _import_openpyxl()
+        from openpyxl.cell import WriteOnlyCell
+        wb = openpyxl.Workbook(write_only=True)
+        details = wb.create_sheet("Details")
+        for column, width in zip("ABCDEFGHI", (8, 12, 12, 30, 18, 16, 12, 12, 8)):
+            details.column_dimensions[column].width = width
+        details.append([title])
+        details.append([f"Exported on: {datetime.now().strftime('%d-%m-%Y %H:%M:%S')}"])
+        details.append([])
+        details.append(["Index","Date","Amount","Description","Category","Payment Method","Day of Week","Month","Year"])
+
+        def cell(ws, value, number_format):
+            c = WriteOnlyCell(ws, value=value)
+            c.number_format = number_format
+            return c
+
+        for i, e in enumerate(rows):
+            day = calendar_day(e.date)
+            details.append([
+                i+1, cell(details, day.dt, 'DD-MM-YYYY'), cell(details, e.amount, '0.00'), e.description,
+                self.category_names[e.category], self.payment_method_names[e.payment_method],
+                day.weekday_name, day.month_name, day.year
+            ])
+        total = totals.total
+
+        by_category = wb.create_sheet("Category Totals")
+        by_category.column_dimensions['A'].width = 18
+        by_category.append(["Category", "Total", "% of Total"])
+        for i, amt in enumerate(totals.category_totals):
+            if amt > 0:
+                by_category.append([self.category_names[i], cell(by_category, amt, '0.00'), cell(by_category, amt/total, '0.00%')])
+        by_category.append([])
+        by_category.append(["Total Expenses", cell(by_category, total, '0.00')])
+
+        by_method = wb.create_sheet("Payment Totals")
+        by_method.column_dimensions['A'].width = 16
+        by_method.append(["Payment Method", "Total"])
+        for i, amt in enumerate(totals.payment_totals):
+            if amt > 0:
+                by_method.append([self.payment_method_names[i], cell(by_method, amt, '0.00')])
+
+        highest = totals.highest
+        top = wb.create_sheet("Highest Expense")
+        top.column_dimensions['B'].width = 30
+        top.append(["Amount", "Description", "Category", "Payment Method", "Date"])
+        top.append([
+            cell(top, highest.amount, '0.00'), highest.description, self.category_names[highest.category],
+            self.payment_method_names[highest.payment_method], cell(top, calendar_day(highest.date).dt, 'DD-MM-YYYY')
+        ])
+        wb.save(filepath)
+
+    def _export_month(self, year, month, fmt) -> Optional[Tuple[str, PeriodTotals]]:
+        title = f"Expense Analysis for {MONTH_NAMES[month-1]} {year}"
+        return self._export_period(f"expense_report_{month:02d}-{year}", title, *_month_bounds(year, month), fmt,
+                                   ('month', year, month))
+
+    def export_to_excel(self, year, month, fmt="csv"):
+        if fmt == "xlsx" and _import_openpyxl() is None:
+            print("Excel export needs openpyxl: pip install openpyxl")
+            return
+        exported = self._export_month(year, month, fmt)
+        if exported is None:
+            print(f"No data found for {MONTH_NAMES[month-1]} {year}. Report not generated.")
+            return
+        print(f"Expense Report is generated with filename: {exported[0]}")
+
+    def _export_range(self, start_date, end_date, fmt) -> Optional[Tuple[str, PeriodTotals]]:
+        stem = f"expense_report_{start_date.strftime('%d-%m-%Y')}_to_{end_date.strftime('%d-%m-%Y')}"
+        title = f"Expense Analysis from {start_date.strftime('%d-%m-%Y')} to {end_date.strftime('%d-%m-%Y')}"
+        bounds = _inclusive_bounds(start_date, end_date)
+        return self._export_period(stem, title, *bounds, fmt, ('range',) + bounds)
+
+    def export_to_excel_date_range(self, start_date, end_date, fmt="csv"):
+        if fmt == "xlsx" and _import_openpyxl() is None:
+            print("Excel export needs openpyxl: pip install openpyxl")
+            return
+        exported = self._export_range(start_date, end_date, fmt)
+        if exported is None:
             print(f"No data found for the selected date range. Report not generated.")
             return
-        filename = f"expense_report_{start_date.strftime('%d-%m-%Y')}_to_{end_date.strftime('%d-%m-%Y')}.csv"
-        filepath = os.path.join(export_dir, filename)
-        # --- Analysis Section ---
-        export_time = datetime.now().strftime('%d-%m-%Y %H:%M:%S')
-        total = sum(e.amount for e in range_exp)
-        # Category-wise totals
-        cat_totals = [0.0]*len(self.category_names)
-        for e in range_exp:
-            cat_totals[e.category] += e.amount
-        # Payment method totals
-        pm_totals = [0.0]*len(self.payment_method_names)
-        for e in range_exp:
-            pm_totals[e.payment_method] += e.amount
-        # Highest expense
-        highest = max(range_exp, key=lambda e: e.amount)
-        highest_dt = datetime.fromtimestamp(highest.date)
-        # --- Write to CSV ---
-        with open(filepath, 'w', newline='', encoding='utf-8') as f:
+        print(f"Expense Report is generated with filename: {exported[0]}")
+
+    @_needs("expenses")
+    def export_months(self, first, last, fmt="csv"):
+        """Export every month from first to last ((year, month) pairs, inclusive) in parallel, one
+        process per month, then write an index of the reports"""
+        if fmt == "xlsx" and _import_openpyxl() is None:
+            print("Excel export needs openpyxl: pip install openpyxl")
+            return
+        months = []
+        year, month = first
+        while (year, month) <= last:
+            months.append((year, month))
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        if not months:
+            print("The last month is before the first. Nothing exported.")
+            return
+        workers = min(len(months), os.cpu_count() or 1)
+        if workers > 1:
+            names = (self.category_names, self.payment_method_names)
+            if self._db is not None:
+                # Workers read the database themselves; WAL lets them run alongside this connection
+                jobs = [(y, m, fmt, names, self._db.path) for y, m in months]
+            else:
+                jobs = [(y, m, fmt, names, [expense_key(e) for e in self._added_between(*_month_bounds(y, m))])
+                        for y, m in months]
+                jobs = [job for job in jobs if job[4]]
+            import concurrent.futures
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+                results = [r for r in pool.map(_export_month_job, jobs) if r is not None]
+        else:
+            # A pool on one core only adds start-up and transfer cost
+            results = [r for r in (_export_month_summary(self, y, m, fmt) for y, m in months) if r is not None]
+        if not results:
+            print("No data found in the selected months. No reports generated.")
+            return
+        (fy, fm), (ly, lm) = months[0], months[-1]
+        import csv
+        index_path = os.path.join(self._export_dir(), f"expense_reports_index_{fm:02d}-{fy}_to_{lm:02d}-{ly}.csv")
+        grand_total = sum(r[4] for r in results)
+        with open(index_path, 'w', newline='', encoding='utf-8') as f:
             writer = csv.writer(f)
             writer.writerow(["SEP=,"])
-            writer.writerow([f"Expense Analysis from {start_date.strftime('%d-%m-%Y')} to {end_date.strftime('%d-%m-%Y')}"])
-            writer.writerow([f"Exported on: {export_time}"])
+            writer.writerow([f"Expense Reports from {MONTH_NAMES[fm-1]} {fy} to {MONTH_NAMES[lm-1]} {ly}"])
+            writer.writerow([f"Exported on: {datetime.now().strftime('%d-%m-%Y %H:%M:%S')}"])
             writer.writerow([])
-            writer.writerow(["Detailed Expenses"])
-            writer.writerow(["Index","Date","Amount","Description","Category","Payment Method","Day of Week","Month","Year"])
-            for i, e in enumerate(sorted(range_exp, key=lambda e: -e.date)):
-                # Use UTC to avoid timezone issues
-                dt = datetime.fromtimestamp(e.date)
-                writer.writerow([
-                    i+1, dt.strftime('%d-%m-%Y'), f"{e.amount:.2f}", e.description, self.category_names[e.category],
-                    self.payment_method_names[e.payment_method], WEEKDAYS[dt.weekday()], MONTH_NAMES[dt.month-1], dt.year
-                ])
-            writer.writerow([])
-            writer.writerow(["Total Expenses", f"{total:.2f}"])
+            writer.writerow(["Month", "Year", "Expenses", "Total", "Top Category", "File"])
+            for year, month, path, count, total, top_category in results:
+                writer.writerow([MONTH_NAMES[month-1], year, count, f"{total:.2f}", top_category, os.path.basename(path)])
             writer.writerow([])
-            writer.writerow(["Category-wise Totals"])
-            writer.writerow(["Category", "Total", "% of Total"])
-            for i, amt in enumerate(cat_totals):
-                if amt > 0:
-                    writer.writerow([self.category_names[i], f"{amt:.2f}", f"{amt/total*100:.2f}%"])
-            writer.writerow([])
-            writer.writerow(["Payment Method Totals"])
-            writer.writerow(["Payment Method", "Total"])
-            for i, amt in enumerate(pm_totals):
-                if amt > 0:
-                    writer.writerow([self.payment_method_names[i], f"{amt:.2f}"])
-            writer.writerow([])
-            writer.writerow(["Highest Expense"])
-            writer.writerow(["Amount", "Description", "Category", "Payment Method", "Date"])
-            writer.writerow([
-                f"{highest.amount:.2f}", highest.description, self.category_names[highest.category],
-                self.payment_method_names[highest.payment_method], highest_dt.strftime('%d-%m-%Y')
-            ])
-        print(f"Expense Report is generated with filename: {filepath}")
+            writer.writerow(["Total Expenses", f"{grand_total:.2f}"])
+        print(f"Generated {len(results)} monthly report(s) in {self._export_dir()}")
+        print(f"Index: {index_path}")
 
+    @_needs("balance")
     def update_balance(self, is_bank):
         bal = self.bank_balance if is_bank else self.cash_balance
         print(f"Current {'bank' if is_bank else 'cash'} balance: {bal:.2f}")
@@ -551,6 +2122,11 @@ class ExpenseTracker:
         except:
             print("Invalid amount.")
             return
+        self.set_balance(is_bank, amount)
+        print(f"{'Bank' if is_bank else 'Cash'} balance updated successfully.")
+
+    @_needs("balance")
+    def set_balance(self, is_bank, amount):
         now = datetime.now().timestamp()
         if is_bank:
             self.bank_balance = amount
@@ -563,8 +2139,8 @@ class ExpenseTracker:
             if len(self.cash_history) > MAX_BALANCE_HISTORY:
                 self.cash_history = self.cash_history[-MAX_BALANCE_HISTORY:]
         self.save_balance()
-        print(f"{'Bank' if is_bank else 'Cash'} balance updated successfully.")
 
+    @_needs("balance")
     def show_balance_history(self, is_bank):
         bal = self.bank_balance if is_bank else self.cash_balance
         hist = self.bank_history if is_bank else self.cash_history
@@ -576,23 +2152,34 @@ class ExpenseTracker:
             dt = datetime.fromtimestamp(h.date)
             print(f"{i+1}. {h.amount:.2f} on {dt.strftime('%d-%m-%Y')}")
 
+    @_needs("expenses")
     def clear_memory(self):
         """Clear all memory entries while keeping current expenses"""
-        if not self.memory:
+        if not self._list_counts()[1]:
             print("Memory is already empty.")
             return
         
         confirm = input("Are you sure you want to clear all memory entries? This action cannot be undone. (y/n): ")
-        if confirm.lower() == 'y':
-            self.memory.clear()
-            self.save_expenses()
+        if confirm.lower() == 'y' and self._db is not None:
+            self._db.clear_memory()
+            print("Memory cleared successfully.")
+        elif confirm.lower() == 'y':
+            with self._committing():
+                self._journal({'op': 'clear_memory'})
+                self._clear_memory()
             print("Memory cleared successfully.")
         else:
             print("Memory clear operation cancelled.")
 
+    def _clear_memory(self):
+        for e in self.memory:
+            self._unlink(e)
+        self.memory.clear()
+
     def reload_categories(self):
         """Force reload categories from file"""
         print("Reloading categories from file...")
+        self._writer.flush()
         self.load_categories()
         print(f"Categories reloaded. Total categories: {len(self.category_names)}")
         for i, cat in enumerate(self.category_names):
@@ -610,53 +2197,136 @@ class ExpenseTracker:
         for i, cat in enumerate(self.category_names):
             print(f"  {i}: {cat}")
 
-    def show_list_info(self):
-        """Show information about the two expense lists"""
+    @_needs("expenses")
+    def show_list_info(self, page=0) -> bool:
+        """Show information about the two expense lists, one page of each; returns True if there are more pages"""
+        main_count, memory_count = self._list_counts()
+        offset = page * INFO_PAGE_SIZE
+        main_page, memory_page = self._list_pages(INFO_PAGE_SIZE, offset)
         print("\n--- Expense Lists Information ---")
-        print(f"Main Expenses List: {len(self.expenses)} entries")
-        print(f"Memory List: {len(self.memory)} entries")
+        print(f"Main Expenses List: {main_count} entries")
+        print(f"Memory List: {memory_count} entries")
         print("\nMain List (Persistent):")
-        if self.expenses:
-            for i, e in enumerate(self.expenses[:30]):  # Show first 30
-                dt = datetime.fromtimestamp(e.date)
-                print(f"  {i+1}. {e.description} - {e.amount:.2f} ({dt.strftime('%d-%m-%Y')})")
-            if len(self.expenses) > 30:
-                print(f"  ... and {len(self.expenses) - 30} more")
+        if main_page:
+            for i, e in enumerate(main_page):
+                print(f"  {offset+i+1}. {e.description} - {e.amount:.2f} ({calendar_day(e.date).text})")
+            if main_count > offset + INFO_PAGE_SIZE:
+                print(f"  ... and {main_count - offset - INFO_PAGE_SIZE} more")
+        elif main_count:
+            print("  No more entries in main list")
         else:
             print("  No expenses in main list")
             
         print("\nMemory List (Recent):")
-        if self.memory:
-            for i, e in enumerate(self.memory[:30]):  # Show first 30
-                dt = datetime.fromtimestamp(e.date)
-                print(f"  {i+1}. {e.description} - {e.amount:.2f} ({dt.strftime('%d-%m-%Y')})")
-            if len(self.memory) > 30:
-                print(f"  ... and {len(self.memory) - 30} more")
+        if memory_page:
+            for i, e in enumerate(memory_page):
+                print(f"  {offset+i+1}. {e.description} - {e.amount:.2f} ({calendar_day(e.date).text})")
+            if memory_count > offset + INFO_PAGE_SIZE:
+                print(f"  ... and {memory_count - offset - INFO_PAGE_SIZE} more")
+        elif memory_count:
+            print("  No more entries in memory list")
         else:
             print("  No expenses in memory list")
         
         print("\nNote: Memory list contains recent expenses and may have duplicates from main list.")
         print("When editing, the system automatically finds and updates the correct entry.")
+        return max(main_count, memory_count) > offset + INFO_PAGE_SIZE
 
     # ... (Other methods for edit/delete balance history, export date range, etc. can be added similarly)
 
+def page_through(show, prompt) -> str:
+    """Call show(page) and read an answer until it is not a page move; show returns True if there is a next page"""
+    page = 0
+    while True:
+        has_next = show(page)
+        answer = input(prompt).strip().lower()
+        if answer == 'n':
+            if has_next:
+                page += 1
+            else:
+                print("Already on the last page.")
+        elif answer == 'p':
+            if page > 0:
+                page -= 1
+            else:
+                print("Already on the first page.")
+        else:
+            return answer
+
+def _detached(category_names, payment_method_names, expenses) -> ExpenseTracker:
+    """A tracker over just the given expenses, listed in the order they were added, for exporting
+    a copy of a period away from the live tracker"""
+    tracker = ExpenseTracker(category_names=list(category_names), payment_method_names=list(payment_method_names))
+    tracker._ranks = {id(e): i for i, e in enumerate(expenses)}
+    tracker._view = _DateSorted(expenses)
+    return tracker
+
+def _export_month_job(job):
+    """Process pool worker for export_months: export one month from the rows it was sent, or from
+    the database at the given path. Returns (year, month, path, count, total, top category) or None."""
+    year, month, fmt, (category_names, payment_method_names), source = job
+    if isinstance(source, str):
+        from sqlite_store import SQLiteStorage
+        tracker = ExpenseTracker(category_names=category_names, payment_method_names=payment_method_names)
+        tracker._db = SQLiteStorage(source, MAX_MEMORY)
+    else:
+        tracker = _detached(category_names, payment_method_names, [Expense(*row) for row in source])
+    try:
+        return _export_month_summary(tracker, year, month, fmt)
+    finally:
+        if tracker._db is not None:
+            tracker._db.close()
+
+def _export_month_summary(tracker, year, month, fmt):
+    exported = tracker._export_month(year, month, fmt)
+    if exported is None:
+        return None
+    path, totals = exported
+    top = max(range(len(tracker.category_names)), key=lambda i: totals.category_totals[i])
+    return year, month, path, totals.count, totals.total, tracker.category_names[top]
+
 def show_main_menu():
     print("\nExpense Tracker\n1. Expenses\n2. Balance\n3. Reports\n4. Settings\n5. Exit\n\nChoice: ", end='')
 
 def show_expenses_menu():
-    print("\nExpenses\n1. Add\n2. List\n3. Edit\n4. Delete\n5. Back\n\nChoice: ", end='')
+    print("\nExpenses\n1. Add\n2. List\n3. Edit\n4. Delete\n5. Search\n6. Back\n\nChoice: ", end='')
 
 def show_balance_menu():
     print("\nBalance\n1. Update\n2. History\n3. Back\n\nChoice: ", end='')
 
 def show_reports_menu():
-    print("\nReports\n1. Total\n2. Summary\n3. Highest\n4. Budget\n5. Export\n6. Back\n\nChoice: ", end='')
+    print("\nReports\n1. Total\n2. Summary\n3. Highest\n4. Budget\n5. Export\n6. Recurring\n7. Back\n\nChoice: ", end='')
 
 def show_export_menu():
-    print("\nExport\n1. Current Month\n2. Specific Month\n3. Date Range\n4. Back\n\nChoice: ", end='')
+    print("\nExport\n1. Current Month\n2. Specific Month\n3. Date Range\n4. All Months in a Range\n5. Back\n\nChoice: ", end='')
+
+def ask_export_format() -> str:
+    val = input("Format - 1. CSV  2. Excel (.xlsx) (Enter for CSV): ").strip()
+    return "xlsx" if val == "2" else "csv"
 
 def show_settings_menu():
-    print("\nSettings\n1. Add Category\n2. Clear Memory\n3. Reload\n4. Reset\n5. Info\n6. Fix Timestamps\n7. Back\n\nChoice: ", end='')
+    print("\nSettings\n1. Add Category\n2. Clear Memory\n3. Reload\n4. Reset\n5. Info\n6. Fix Timestamps\n7. Diagnostics\n8. Category Rules\n9. Back\n\nChoice: ", end='')
+
+def show_diagnostics():
+    """Settings > Diagnostics: timings and counters so far, with reset and profile dump"""
+    if not diagnostics.enabled():
+        print("\nDiagnostics are off. Start with --diagnostics (or EXPENSE_TRACKER_DIAGNOSTICS=1) to record timings,")
+        print("and add --profile FILE (or EXPENSE_TRACKER_PROFILE=FILE) to profile the session.")
+        return
+    while True:
+        print("\n--- Diagnostics ---")
+        print(diagnostics.report())
+        answer = input("\nr = reset, s = save profile, Enter to go back: ").strip().lower()
+        if answer == 'r':
+            diagnostics.reset()
+        elif answer == 's':
+            path = diagnostics.dump_profile()
+            if path is None:
+                print("Profiling is off. Start with --profile FILE to profile the session.")
+            else:
+                print(f"Profile written to {path} (open it with python -m pstats {path})")
+        else:
+            return
 
 def main():
     tracker = ExpenseTracker()
@@ -683,7 +2353,12 @@ def main():
                         print("Categories:")
                         for i, cat in enumerate(tracker.category_names):
                             print(f"{i}: {cat}")
-                        category = int(input("Choose category: "))
+                        suggested = tracker.suggest_category(desc)
+                        if suggested is None:
+                            category = int(input("Choose category: "))
+                        else:
+                            category = input(f"Choose category (Enter for {suggested}: {tracker.category_names[suggested]}): ").strip()
+                            category = int(category) if category else suggested
                         print("Payment Methods:")
                         for i, pm in enumerate(tracker.payment_method_names):
                             print(f"{i}: {pm}")
@@ -704,53 +2379,36 @@ def main():
                     except Exception as e:
                         print("Invalid input.", e)
                 elif ch == 2:
-                    tracker.list_expenses()
+                    page_through(tracker.list_expenses, "n = next page, p = previous page, Enter to go back: ")
                 elif ch == 3:
-                    tracker.list_expenses()
                     try:
-                        idx = int(input("Enter number to edit (0 to cancel): "))
+                        idx = int(page_through(tracker.list_expenses, "Enter number to edit (0 to cancel, n/p to change page): "))
                         if idx == 0:
                             continue
-                        # Get the combined list that matches what was displayed (same logic as list_expenses)
-                        memory_first = tracker.memory + [e for e in tracker.expenses if not any(tracker.is_duplicate(e, c) for c in tracker.memory)]
-                        all_exp = sorted(memory_first, key=lambda e: -e.date)
-                        if 1 <= idx <= len(all_exp):
-                            expense_to_edit = all_exp[idx-1]
+                        # Same numbering as list_expenses
+                        expense_to_edit = tracker.listed_expense(idx)
+                        if expense_to_edit is not None:
                             print(f"\nSelected expense: {expense_to_edit.description} (Amount: {expense_to_edit.amount:.2f})")
                             
-                            # Find which list this expense belongs to and edit accordingly
-                            if expense_to_edit in tracker.expenses:
-                                expense_idx = tracker.expenses.index(expense_to_edit)
-                                print(f"Found in main expenses list at index {expense_idx}")
-                                tracker.edit_expense(expense_idx, False)
-                            elif expense_to_edit in tracker.memory:
-                                expense_idx = tracker.memory.index(expense_to_edit)
-                                print(f"Found in memory list at index {expense_idx}")
-                                tracker.edit_expense(expense_idx, True)
-                            else:
-                                print("Error: Expense not found in any list.")
+                            tracker.edit_selected(expense_to_edit)
                         else:
                             print("Invalid selection.")
                     except Exception as e:
                         print("Invalid input.", e)
                 elif ch == 4:
-                    tracker.list_expenses()
                     try:
-                        idx = int(input("Enter number to delete (0 to cancel): "))
+                        idx = int(page_through(tracker.list_expenses, "Enter number to delete (0 to cancel, n/p to change page): "))
                         if idx == 0:
                             continue
-                        # Get the combined list that matches what was displayed (same logic as list_expenses)
-                        memory_first = tracker.memory + [e for e in tracker.expenses if not any(tracker.is_duplicate(e, c) for c in tracker.memory)]
-                        all_exp = sorted(memory_first, key=lambda e: -e.date)
-                        if 1 <= idx <= len(all_exp):
-                            expense_to_delete = all_exp[idx-1]
+                        # Same numbering as list_expenses
+                        expense_to_delete = tracker.listed_expense(idx)
+                        if expense_to_delete is not None:
                             print(f"\nSelected expense to delete:")
                             print(f"Description: {expense_to_delete.description}")
                             print(f"Amount: {expense_to_delete.amount:.2f}")
                             print(f"Category: {tracker.category_names[expense_to_delete.category]}")
                             print(f"Payment Method: {tracker.payment_method_names[expense_to_delete.payment_method]}")
-                            dt = datetime.fromtimestamp(expense_to_delete.date)
-                            print(f"Date: {dt.strftime('%d-%m-%Y')}")
+                            print(f"Date: {calendar_day(expense_to_delete.date).text}")
                             
                             confirm = input("\nAre you sure you want to delete this expense? (y/n): ").strip().lower()
                             if confirm == 'y':
@@ -763,6 +2421,8 @@ def main():
                     except:
                         print("Invalid input.")
                 elif ch == 5:
+                    tracker.search_prompt()
+                elif ch == 6:
                     break
                 else:
                     print("Invalid option.")
@@ -795,7 +2455,7 @@ def main():
                     print("Invalid input.")
                     continue
                 if ch == 1:
-                    total = sum(e.amount for e in tracker.expenses)
+                    total = tracker.main_list_total()
                     print(f"Total for all current expenses: {total:.2f}")
                 elif ch == 2:
                     tracker.category_summary()
@@ -815,9 +2475,11 @@ def main():
                         except:
                             print("Invalid input.")
                             continue
+                        if export_ch in (1, 2, 3, 4):
+                            fmt = ask_export_format()
                         if export_ch == 1:
                             now = datetime.now()
-                            tracker.export_to_excel(now.year, now.month)
+                            tracker.export_to_excel(now.year, now.month, fmt)
                         elif export_ch == 2:
                             try:
                                 val = input("Enter month (1-12) and year (YYYY): ")
@@ -825,7 +2487,7 @@ def main():
                                 if not (1 <= month <= 12 and 1900 <= year <= 2200):
                                     print("Invalid month or year.")
                                     continue
-                                tracker.export_to_excel(year, month)
+                                tracker.export_to_excel(year, month, fmt)
                             except:
                                 print("Invalid input.")
                         elif export_ch == 3:
@@ -836,14 +2498,26 @@ def main():
                                 ed, em, ey = map(int, end_str.strip().split())
                                 start_date = datetime(sy, sm, sd, 0, 0, 0)
                                 end_date = datetime(ey, em, ed, 23, 59, 59)
-                                tracker.export_to_excel_date_range(start_date, end_date)
+                                tracker.export_to_excel_date_range(start_date, end_date, fmt)
                             except:
                                 print("Invalid input.")
                         elif export_ch == 4:
+                            try:
+                                fm, fy = map(int, input("Enter first month (1-12) and year (YYYY): ").strip().split())
+                                lm, ly = map(int, input("Enter last month (1-12) and year (YYYY): ").strip().split())
+                                if not (1 <= fm <= 12 and 1 <= lm <= 12 and 1900 <= fy <= 2200 and 1900 <= ly <= 2200):
+                                    print("Invalid month or year.")
+                                    continue
+                                tracker.export_months((fy, fm), (ly, lm), fmt)
+                            except ValueError:
+                                print("Invalid input.")
+                        elif export_ch == 5:
                             break
                         else:
                             print("Invalid option.")
                 elif ch == 6:
+                    tracker.show_recurring()
+                elif ch == 7:
                     break
                 else:
                     print("Invalid option.")
@@ -866,20 +2540,175 @@ def main():
                 elif ch == 4:
                     tracker.reset_categories()
                 elif ch == 5:
-                    tracker.show_list_info()
+                    page_through(tracker.show_list_info, "n = next page, p = previous page, Enter to go back: ")
                 elif ch == 6:
                     tracker.fix_timestamps()
                 elif ch == 7:
+                    show_diagnostics()
+                elif ch == 8:
+                    tracker.rules_prompt()
+                elif ch == 9:
                     break
                 else:
                     print("Invalid option.")
         elif choice == 5:
+            tracker.flush()
             print("Goodbye!")
             break
         else:
             print("Invalid option.")
 
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Personal expense tracker. Run without a command for the interactive menu.")
+    parser.add_argument("--diagnostics", action="store_true", help="record operation timings and counters")
+    parser.add_argument("--profile", metavar="FILE", help="profile the session and write pstats to FILE on exit")
+    commands = parser.add_subparsers(dest="command", metavar="command")
+
+    add = commands.add_parser("add", help="add one expense")
+    add.add_argument("amount", type=float)
+    add.add_argument("description")
+    add.add_argument("-c", "--category", help="category name or number (default: suggested by the category rules and history, else Miscellaneous)")
+    add.add_argument("-p", "--payment", default="Cash", help="payment method name or number")
+    add.add_argument("-d", "--date", help="DD-MM-YYYY (default: today)")
+
+    lst = commands.add_parser("list", help="list expenses, newest first")
+    lst.add_argument("--page", type=int, default=1)
+
+    find = commands.add_parser("search", help="find expenses by description words, prefixes or near spellings")
+    find.add_argument("text", nargs="?", default="", help="words to look for (default: any description)")
+    find.add_argument("-c", "--category", help="only this category (name or number)")
+    find.add_argument("-p", "--payment", help="only this payment method (name or number)")
+    find.add_argument("--min", type=float, help="smallest amount")
+    find.add_argument("--max", type=float, help="largest amount")
+    find.add_argument("--from", dest="start", help="first date, DD-MM-YYYY")
+    find.add_argument("--to", dest="end", help="last date, DD-MM-YYYY")
+    find.add_argument("--page", type=int, default=1)
+
+    report = commands.add_parser("report", help="monthly totals, category summary and highest expense")
+    report.add_argument("--month", help="MM-YYYY (default: this month)")
+    report.add_argument("--budget", type=float, help="also compare the month against a budget")
+
+    commands.add_parser("recurring", help="expenses that repeat (rent, subscriptions, bills) and when they are next due")
+
+    export = commands.add_parser("export", help="write a report file to ~/Downloads/Expense Reports")
+    period = export.add_mutually_exclusive_group()
+    period.add_argument("--month", help="MM-YYYY (default: this month)")
+    period.add_argument("--range", nargs=2, metavar=("START", "END"), help="two DD-MM-YYYY dates, inclusive")
+    period.add_argument("--months", nargs=2, metavar=("FIRST", "LAST"), help="one report per month from FIRST to LAST (MM-YYYY)")
+    export.add_argument("-f", "--format", choices=("csv", "xlsx"), default="csv")
+
+    imp = commands.add_parser("import", help="bulk-load expenses from CSV or JSON statements")
+    imp.add_argument("files", nargs="+", metavar="file")
+    imp.add_argument("-c", "--category", help="category for rows without one (default: suggested for each row, else Miscellaneous)")
+    imp.add_argument("-p", "--payment", default="Card", help="payment method for rows without one")
+
+    rules = commands.add_parser("rules", help="list, add, remove or try out automatic category rules")
+    change = rules.add_mutually_exclusive_group()
+    change.add_argument("--add", nargs=2, metavar=("PATTERN", "CATEGORY"), help="send descriptions matching PATTERN to CATEGORY")
+    change.add_argument("--remove", type=int, metavar="N", help="remove rule N")
+    change.add_argument("--test", metavar="DESCRIPTION", help="show the category a description would get, and why")
+    rules.add_argument("--regex", action="store_true", help="with --add: PATTERN is a regular expression, not a keyword")
+
+    serve = commands.add_parser("serve", help="share the tracker over a local HTTP/JSON API")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    return parser
+
+def parse_month(text) -> Tuple[int, int]:
+    """(year, month) from MM-YYYY"""
+    month, year = map(int, text.replace('/', '-').split('-'))
+    if not (1 <= month <= 12 and 1900 <= year <= 2200):
+        raise ValueError(f"invalid month '{text}'")
+    return year, month
+
+def run_cli(argv) -> int:
+    args = build_parser().parse_args(argv)
+    profile = args.profile or PROFILE_FILE
+    if args.diagnostics or DIAGNOSTICS or profile:
+        diagnostics.enable(profile)
+    if args.command is None:
+        main()
+        return 0
+    tracker = ExpenseTracker()
+    tracker.init_tracker()
+    try:
+        if args.command == "add":
+            category = tracker.suggest_category(args.description) if args.category is None else None
+            if category is None:
+                category = resolve_choice(args.category or "Miscellaneous", tracker.category_names, "category")
+            payment_method = resolve_choice(args.payment, tracker.payment_method_names, "payment method")
+            day = parse_date(args.date) if args.date else datetime.combine(datetime.now().date(), datetime.min.time())
+            if not tracker.add_expense(args.amount, args.description[:MAX_DESC], category, payment_method, day.timestamp()):
+                return 1
+        elif args.command == "list":
+            tracker.list_expenses(max(args.page, 1) - 1)
+        elif args.command == "search":
+            category = resolve_choice(args.category, tracker.category_names, "category") if args.category else None
+            payment_method = resolve_choice(args.payment, tracker.payment_method_names, "payment method") if args.payment else None
+            end = parse_date(args.end).replace(hour=23, minute=59, second=59) if args.end else None
+            results = tracker.search_expenses(args.text, category, payment_method, args.min, args.max,
+                                              parse_date(args.start) if args.start else None, end)
+            tracker.show_search_results(results, max(args.page, 1) - 1)
+        elif args.command == "report":
+            year, month = parse_month(args.month) if args.month else (datetime.now().year, datetime.now().month)
+            totals = tracker._month_totals(year, month)
+            print(f"Total expenses for {MONTH_NAMES[month-1]} {year}: {totals.total if totals else 0.0:.2f}\n")
+            tracker.category_summary(year, month)
+            if totals:
+                print("\nHighest expense:")
+                tracker.find_highest_expense(year, month)
+            if args.budget is not None:
+                tracker.budget_alert(args.budget, year, month)
+        elif args.command == "recurring":
+            tracker.show_recurring()
+        elif args.command == "export":
+            if args.range:
+                start, end = (parse_date(d) for d in args.range)
+                tracker.export_to_excel_date_range(start, end.replace(hour=23, minute=59, second=59), args.format)
+            elif args.months:
+                tracker.export_months(parse_month(args.months[0]), parse_month(args.months[1]), args.format)
+            else:
+                year, month = parse_month(args.month) if args.month else (datetime.now().year, datetime.now().month)
+                tracker.export_to_excel(year, month, args.format)
+        elif args.command == "import":
+            if args.category is not None:
+                resolve_choice(args.category, tracker.category_names, "category")
+            resolve_choice(args.payment, tracker.payment_method_names, "payment method")
+            rows = itertools.chain.from_iterable(read_statement(path) for path in args.files)
+            added, duplicates, rejected = tracker.import_statement(rows, args.category, args.payment)
+            print(f"Imported {added} expense(s); skipped {duplicates} already recorded and {len(rejected)} invalid row(s).")
+            for number, reason in rejected[:20]:
+                print(f"  row {number}: {reason}")
+            if len(rejected) > 20:
+                print(f"  ... and {len(rejected) - 20} more")
+        elif args.command == "rules":
+            if args.add:
+                tracker.add_rule(*args.add, regex=args.regex)
+                print("Rule added.")
+            elif args.remove is not None:
+                if tracker.remove_rule(args.remove) is None:
+                    print(f"Error: no rule {args.remove}")
+                    return 1
+                print(f"Rule {args.remove} removed.")
+            if args.test is not None:
+                tracker.explain_category(args.test)
+            else:
+                tracker.show_rules()
+        elif args.command == "serve":
+            import server
+            # Load the data before the first request rather than during it
+            tracker.expense_count()
+            server.serve(tracker, args.host, args.port)
+    except (ValueError, OSError) as e:
+        print(f"Error: {e}")
+        return 1
+    finally:
+        tracker.flush()
+        if diagnostics.enabled():
+            print(diagnostics.report(), file=sys.stderr)
+    return 0
+
 if __name__ == "__main__":
-    main() 
+    sys.exit(run_cli(sys.argv[1:]))
 
     
\ No newline at end of file
@@ -0,0 +1,180 @@
+"""Write-behind persistence: atomic file replacement, a debounced background flusher, and the
+locking that lets several processes share one data directory.
+
+Callers schedule a write under a key instead of doing it. A background thread runs the pending
+writes once no new one has arrived for `delay` seconds (or `max_delay` after the first, if
+changes keep coming), so a burst of changes costs one write per key. A newer write scheduled
+under the same key replaces the pending one. flush() runs whatever is pending in the caller's
+thread; every live flusher is flushed at interpreter exit.
+
+FileLock serializes writers across processes with an advisory lock (fcntl.flock) on a lock file.
+SharedFile keeps a small whole-file dataset (balances, categories) from being clobbered: a write
+that finds the file changed since it was read merges with that change instead of replacing it."""
+import atexit
+import os
+import threading
+import time
+import weakref
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: without flock, FileLock only keeps this process's threads apart
+    fcntl = None
+
+_flushers = weakref.WeakSet()
+
+
+def atomic_write(path, data: bytes):
+    """Replace path with data so readers see either the old file or the new one, never a mix"""
+    tmp = path + ".tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class WriteBehind:
+    def __init__(self, delay=0.5, max_delay=2.0):
+        self.delay = delay
+        self.max_delay = max_delay
+        self._cond = threading.Condition()
+        # Held while writes run, so flush() waits for a write the thread has already started
+        self._running = threading.Lock()
+        self._pending = {}
+        self._first = self._last = 0.0
+        self._thread = None
+        _flushers.add(self)
+
+    def schedule(self, key, write):
+        """Run write() soon on the background thread, replacing any write pending under key"""
+        with self._cond:
+            now = time.monotonic()
+            if not self._pending:
+                self._first = now
+            self._last = now
+            self._pending[key] = write
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def flush(self):
+        """Run every pending write now, in the order they were first scheduled"""
+        with self._running:
+            self._write(self._take())
+
+    def _take(self):
+        with self._cond:
+            writes, self._pending = self._pending, {}
+        return writes
+
+    def _write(self, writes):
+        for key, write in writes.items():
+            try:
+                write()
+            except Exception as e:
+                # Nothing can be raised to the user from here; the next change to key writes it again
+                print(f"\nError saving {key}: {e}")
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                while True:
+                    due = min(self._last + self.delay, self._first + self.max_delay)
+                    wait = due - time.monotonic()
+                    if wait <= 0:
+                        break
+                    self._cond.wait(wait)
+            self.flush()
+
+
+@atexit.register
+def _flush_all():
+    for flusher in list(_flushers):
+        flusher.flush()
+
+
+def file_stamp(path) -> tuple:
+    """(inode, size, modification time) of path (or of an open file descriptor), or () if it does
+    not exist; changes whenever the file does"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return ()
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+class FileLock:
+    """Exclusive advisory lock on path, held against other processes that lock the same file and
+    against other threads of this one. Reentrant: the thread holding it may take it again."""
+
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            try:
+                if self._fd is None:
+                    self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            except BaseException:
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0 and fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._thread_lock.release()
+
+
+class SharedFile:
+    """A small file that several processes rewrite whole. Each remembers the content it last read
+    or wrote as its base. A write that finds anything else on disk writes merge(base, ours, theirs)
+    instead of ours, and leaves the file marked changed so that the merge is read back."""
+
+    def __init__(self, path, lock, read, encode, merge, write):
+        self.path = path
+        self.lock = lock
+        self._read, self._encode, self._merge, self._write_file = read, encode, merge, write
+        self.base = None  # None until read: nothing to keep in step with
+        self._stamp = None
+        self._saving = None  # content of the latest save not yet written
+
+    def read(self):
+        """The file's content now, which becomes the base"""
+        with self.lock:
+            self._stamp = file_stamp(self.path)
+            self.base = self._read(self.path)
+        return self.base
+
+    def changed(self) -> bool:
+        """Whether the file changed since this process read or wrote it, unless a save of its own is pending"""
+        return self.base is not None and self._saving is None and file_stamp(self.path) != self._stamp
+
+    def save(self, flusher, key, content):
+        """Write content soon through flusher (a WriteBehind), under key"""
+        base = self.base
+        self._saving = content
+        flusher.schedule(key, lambda: self._write(base, content))
+
+    def _write(self, base, content):
+        with self.lock:
+            theirs = self._read(self.path)
+            merged = content if theirs == base else self._merge(base, content, theirs)
+            self._write_file(self.path, self._encode(merged))
+            self.base = merged
+            # A stamp no file has makes changed() true, so a merge is read back on the next check
+            self._stamp = file_stamp(self.path) if merged == content else ()
+            if self._saving is content:
+                self._saving = None
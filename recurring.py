@@ -0,0 +1,138 @@
+"""Recurring expenses (rent, subscriptions, utilities) found in the history, and when they fall due next.
+
+detect() takes expenses oldest first, as the tracker's date-sorted view holds them, and never
+compares them pairwise:
+1. one pass groups them by the usual form of their description (categorize.usual_form), each
+   group keeping date order;
+2. within a group, the amounts are sorted and cut wherever one is more than AMOUNT_TOLERANCE
+   above the one before, so two plans under one name (a 199 and a 649 subscription) become two
+   series while a bill that drifts a little stays one;
+3. a series of MIN_OCCURRENCES or more recurs if its median gap between dates is near one of
+   CADENCES and at least REGULAR_SHARE of its gaps are.
+Everything is linear in the group sizes but the sort of each group's amounts, so the whole is
+O(n log n) at worst and close to linear when the groups are small."""
+import calendar
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from categorize import usual_form
+
+DAY = 24 * 60 * 60
+# name, days between occurrences, and how many days either way an occurrence may fall
+CADENCES = (("weekly", 7, 1), ("fortnightly", 14, 2), ("monthly", 30.44, 4), ("quarterly", 91.31, 10),
+            ("yearly", 365.25, 15))
+# Whole months each of the calendar cadences steps by; the others step by their days
+CADENCE_MONTHS = {"monthly": 1, "quarterly": 3, "yearly": 12}
+MIN_OCCURRENCES = 3
+AMOUNT_TOLERANCE = 0.25
+REGULAR_SHARE = 0.75
+
+
+@dataclass
+class Series:
+    description: str  # as it was last written
+    category: int
+    payment_method: int
+    amount: float  # the median, which projections use
+    cadence: str
+    period_days: float
+    tolerance_days: float
+    expenses: list = field(repr=False)  # the occurrences, oldest first
+
+    @property
+    def last_date(self) -> float:
+        return self.expenses[-1].date
+
+    @property
+    def next_date(self) -> float:
+        """When the occurrence after the last one is expected"""
+        return _step(datetime.fromtimestamp(self.last_date), self.cadence, self.period_days, 1).timestamp()
+
+    def active(self, as_of_ts) -> bool:
+        """Whether it has not missed an occurrence by as_of_ts"""
+        return as_of_ts - self.last_date <= (self.period_days + self.tolerance_days) * DAY
+
+    def due_between(self, start_ts, stop_ts) -> List[float]:
+        """Projected dates start_ts <= date < stop_ts of the occurrences after the last one"""
+        dates = []
+        last = datetime.fromtimestamp(self.last_date)
+        n = 1
+        while True:
+            ts = _step(last, self.cadence, self.period_days, n).timestamp()
+            if ts >= stop_ts:
+                return dates
+            if ts >= start_ts:
+                dates.append(ts)
+            n += 1
+
+
+def _median(values) -> float:
+    # Not statistics.median: importing statistics would cost startup more than this saves
+    ordered = sorted(values)
+    mid = len(ordered) // 2
+    return ordered[mid] if len(ordered) % 2 else (ordered[mid - 1] + ordered[mid]) / 2
+
+
+def _step(start: datetime, cadence, period_days, n) -> datetime:
+    """The n-th occurrence after start: calendar cadences keep the day of the month (or the
+    month's last day, if shorter), the others add whole periods"""
+    months = CADENCE_MONTHS.get(cadence)
+    if months is None:
+        return start + timedelta(days=period_days * n)
+    index = start.month - 1 + months * n
+    year, month = start.year + index // 12, index % 12 + 1
+    return start.replace(year=year, month=month, day=min(start.day, calendar.monthrange(year, month)[1]))
+
+
+def _cadence(dates):
+    """(name, days, tolerance) of the cadence the gaps between dates keep to, or None"""
+    gaps = [(b - a) / DAY for a, b in zip(dates, dates[1:])]
+    typical = _median(gaps)
+    for cadence in CADENCES:
+        _, days, tolerance = cadence
+        if abs(typical - days) <= tolerance:
+            regular = sum(1 for g in gaps if abs(g - days) <= tolerance)
+            return cadence if regular >= REGULAR_SHARE * len(gaps) else None
+    return None
+
+
+def _amount_bands(group):
+    """group cut into runs of similar amounts, each back in date order"""
+    order = sorted(range(len(group)), key=lambda i: group[i].amount)
+    bands, band = [], [order[0]]
+    for prev, i in zip(order, order[1:]):
+        if group[i].amount > group[prev].amount * (1 + AMOUNT_TOLERANCE):
+            bands.append(band)
+            band = []
+        band.append(i)
+    bands.append(band)
+    return [[group[i] for i in sorted(band)] for band in bands]
+
+
+def detect(expenses) -> List[Series]:
+    """The recurring series among expenses (oldest first), most expensive first"""
+    groups: Dict[str, list] = {}
+    # Descriptions repeat, so each distinct one is reduced once
+    forms: Dict[str, str] = {}
+    for e in expenses:
+        form = forms.get(e.description)
+        if form is None:
+            form = forms[e.description] = usual_form(e.description)
+        groups.setdefault(form, []).append(e)
+    found = []
+    for group in groups.values():
+        if len(group) < MIN_OCCURRENCES:
+            continue
+        for band in _amount_bands(group):
+            if len(band) < MIN_OCCURRENCES:
+                continue
+            cadence = _cadence([e.date for e in band])
+            if cadence is None:
+                continue
+            name, days, tolerance = cadence
+            last = band[-1]
+            found.append(Series(last.description, last.category, last.payment_method,
+                                _median(e.amount for e in band), name, days, tolerance, band))
+    found.sort(key=lambda s: -s.amount)
+    return found
@@ -0,0 +1,126 @@
+"""Inverted word index over expense descriptions, for word, prefix and typo-tolerant search.
+
+Descriptions repeat heavily ("Groceries", "Uber to office"), so the index maps each word to the
+distinct descriptions containing it, and each description to the rows that carry it: it grows
+with the vocabulary rather than with the history, and a query touches only the descriptions it
+matches. A query word matches an indexed word that equals it, starts with it, or (from
+FUZZY_MIN_LENGTH letters up) is one typo away from it: one letter missing, extra, wrong, or two
+neighbours swapped. Every query word must match for a description to be found."""
+import bisect
+import re
+
+WORD = re.compile(r"[^\W_]+")
+FUZZY_MIN_LENGTH = 4
+
+
+def words(text) -> list:
+    """The lowercase words of text, in order"""
+    return WORD.findall(text.lower())
+
+
+def _deletions(word):
+    """word with each one of its letters left out"""
+    return {word[:i] + word[i+1:] for i in range(len(word))}
+
+
+def _one_edit_apart(a, b) -> bool:
+    """Whether a and b differ by exactly one inserted, deleted or replaced letter, or one swap of neighbours"""
+    if abs(len(a) - len(b)) > 1 or a == b:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) < len(b):
+        return a[i:] == b[i+1:]
+    return a[i+1:] == b[i+1:] or (i + 1 < len(a) and a[i] == b[i+1] and a[i+1] == b[i] and a[i+2:] == b[i+2:])
+
+
+class SearchIndex:
+    def __init__(self):
+        # description -> {id(row): row} of the rows carrying it
+        self.rows = {}
+        # word -> descriptions containing it
+        self._postings = {}
+        # The same words sorted, for prefix lookups
+        self._sorted = []
+        # word with one letter left out -> words that give it, for typo lookups
+        self._near = {}
+
+    def add(self, description, row):
+        rows = self.rows.get(description)
+        if rows is None:
+            rows = self.rows[description] = {}
+            for word in set(words(description)):
+                self._index_word(word, description)
+        rows[id(row)] = row
+
+    def discard(self, description, row):
+        rows = self.rows.get(description)
+        if rows is None or rows.pop(id(row), None) is None:
+            return
+        if not rows:
+            del self.rows[description]
+            for word in set(words(description)):
+                self._unindex_word(word, description)
+
+    def _index_word(self, word, description):
+        holders = self._postings.get(word)
+        if holders is None:
+            holders = self._postings[word] = set()
+            bisect.insort(self._sorted, word)
+            for near in _deletions(word):
+                self._near.setdefault(near, set()).add(word)
+        holders.add(description)
+
+    def _unindex_word(self, word, description):
+        holders = self._postings[word]
+        holders.discard(description)
+        if holders:
+            return
+        del self._postings[word]
+        del self._sorted[bisect.bisect_left(self._sorted, word)]
+        for near in _deletions(word):
+            spelled = self._near[near]
+            spelled.discard(word)
+            if not spelled:
+                del self._near[near]
+
+    def _matching_words(self, term):
+        """Indexed words that term matches: itself, those it starts, and those one typo away"""
+        found = set()
+        i = bisect.bisect_left(self._sorted, term)
+        while i < len(self._sorted) and self._sorted[i].startswith(term):
+            found.add(self._sorted[i])
+            i += 1
+        if len(term) >= FUZZY_MIN_LENGTH:
+            # Two words one edit apart share a one-letter deletion, or one is a deletion of the other
+            candidates = set(self._near.get(term, ()))
+            for near in _deletions(term):
+                if near in self._postings:
+                    candidates.add(near)
+                candidates.update(self._near.get(near, ()))
+            found.update(w for w in candidates if _one_edit_apart(term, w))
+        return found
+
+    def matching(self, query):
+        """The set of descriptions every word of query matches, or None if query has no words"""
+        terms = set(words(query))
+        if not terms:
+            return None
+        found = None
+        # Each term's descriptions, fewest first, so the intersection shrinks as early as it can
+        per_term = []
+        for term in terms:
+            descriptions = set()
+            for word in self._matching_words(term):
+                descriptions |= self._postings[word]
+            if not descriptions:
+                return set()
+            per_term.append(descriptions)
+        for descriptions in sorted(per_term, key=len):
+            found = descriptions if found is None else found & descriptions
+            if not found:
+                break
+        return found
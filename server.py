@@ -0,0 +1,349 @@
+"""Local HTTP/JSON API over one shared ExpenseTracker, so several people can use one set of data files.
+
+    python main.py serve [--host 127.0.0.1] [--port 8765]
+
+Endpoints (JSON bodies and responses):
+    GET    /expenses?page=1&size=50               newest first, with the total count
+    GET    /expenses/search?q=uber&page=1&size=50 matches newest first; also category, payment_method,
+                                                  min_amount, max_amount, start and end filters
+    POST   /expenses                              {"amount", "description", "category", "payment_method", "date"};
+                                                  without a category, the one the category rules suggest
+    PUT    /expenses                              {"key": [...]} plus any of the fields above to change
+    DELETE /expenses                              {"key": [...]}
+    GET    /reports/month?month=MM-YYYY&budget=N  totals, category and payment breakdown, highest expense;
+                                                  with a budget, also the month-end forecast
+    GET    /reports/recurring                     recurring expenses still running, with when each is next due
+    GET    /reports/range?start=DD-MM-YYYY&end=DD-MM-YYYY
+    POST   /exports                               {"month": "MM-YYYY"} or {"start", "end"}; "format" csv or xlsx
+
+"key" is the list every expense in a response carries; it names that expense in later edits and deletes.
+Category and payment method may be given by name or number, dates as DD-MM-YYYY.
+
+Connections are served on one event loop, and every tracker call runs on one dedicated thread, so
+the loop never waits on the tracker's file locks or disk reads and no two calls ever overlap.
+Reads are answered as they arrive from the tracker's indexes and report cache. Writes go through a
+queue to a single writer task that hands them to that thread one at a time in arrival order. Exports
+copy the period's rows on the tracker thread and write the file on another worker thread, so a long
+export holds up neither reads nor writes."""
+import asyncio
+import concurrent.futures
+import json
+from datetime import datetime
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+import main
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_BODY = 64 * 1024
+MAX_PAGE_SIZE = 500
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class ApiServer:
+    def __init__(self, tracker: main.ExpenseTracker):
+        self.tracker = tracker
+        self._tracker_thread = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="tracker")
+        self._writes = None
+        self._writer_task = None
+        self._routes = {
+            ("GET", "/expenses"): self.list_expenses,
+            ("GET", "/expenses/search"): self.search_expenses,
+            ("POST", "/expenses"): self.add_expense,
+            ("PUT", "/expenses"): self.edit_expense,
+            ("DELETE", "/expenses"): self.delete_expense,
+            ("GET", "/reports/month"): self.month_report,
+            ("GET", "/reports/range"): self.range_report,
+            ("GET", "/reports/recurring"): self.recurring_report,
+            ("POST", "/exports"): self.export,
+        }
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT) -> asyncio.AbstractServer:
+        self._writes = asyncio.Queue()
+        self._writer_task = asyncio.ensure_future(self._writer())
+        return await asyncio.start_server(self._serve_connection, host, port)
+
+    async def run(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        server = await self.start(host, port)
+        print(f"Serving the expense tracker on http://{host}:{port}/ (Ctrl+C to stop)")
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        """Let the tracker thread finish its current call and stop; the caller may use the tracker again after"""
+        self._tracker_thread.shutdown()
+
+    async def _call(self, fn):
+        """Run fn() on the tracker thread and wait for its result"""
+        return await asyncio.get_running_loop().run_in_executor(self._tracker_thread, fn)
+
+    # --- Writes ---
+
+    async def _writer(self):
+        while True:
+            change, done = await self._writes.get()
+            try:
+                done.set_result(await self._call(change))
+            except Exception as e:
+                done.set_exception(e)
+
+    async def _write(self, change):
+        """Queue change() for the writer task and wait for its result"""
+        done = asyncio.get_running_loop().create_future()
+        await self._writes.put((change, done))
+        return await done
+
+    # --- HTTP ---
+
+    async def _serve_connection(self, reader, writer):
+        """Answer requests on one connection until the client closes it or asks to"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self._respond(writer, HTTPStatus.BAD_REQUEST, {'error': "malformed request line"}, False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = version == "HTTP/1.1" and headers.get('connection', '').lower() != "close"
+                length = int(headers.get('content-length') or 0)
+                if length > MAX_BODY:
+                    await self._respond(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {'error': "body too large"}, False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+                status, payload = await self._dispatch(method, target, body)
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status, payload, keep_alive):
+        data = json.dumps(payload).encode('utf-8')
+        head = (f"HTTP/1.1 {status.value} {status.phrase}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(data)}\r\n")
+        if not keep_alive:
+            head += "Connection: close\r\n"
+        writer.write(head.encode('latin-1') + b"\r\n" + data)
+        await writer.drain()
+
+    async def _dispatch(self, method, target, body):
+        url = urlsplit(target)
+        handler = self._routes.get((method, url.path))
+        if handler is None:
+            if any(path == url.path for _, path in self._routes):
+                return HTTPStatus.METHOD_NOT_ALLOWED, {'error': f"{method} is not supported on {url.path}"}
+            return HTTPStatus.NOT_FOUND, {'error': f"no such endpoint {url.path}"}
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            data = json.loads(body) if body else {}
+            if not isinstance(data, dict):
+                raise ValueError("the request body must be a JSON object")
+            return await handler(query, data)
+        except ApiError as e:
+            return e.status, {'error': str(e)}
+        except (ValueError, KeyError, TypeError) as e:
+            return HTTPStatus.BAD_REQUEST, {'error': str(e) if not isinstance(e, KeyError) else f"missing {e}"}
+
+    # --- JSON shapes ---
+
+    def _expense_json(self, e: main.Expense) -> dict:
+        t = self.tracker
+        return {
+            'key': list(main.expense_key(e)), 'amount': e.amount, 'description': e.description,
+            'category': t.category_names[e.category], 'payment_method': t.payment_method_names[e.payment_method],
+            'date': main.calendar_day(e.date).text,
+        }
+
+    def _totals_json(self, totals) -> dict:
+        t = self.tracker
+        if not totals:
+            return {'count': 0, 'total': 0.0, 'categories': {}, 'payment_methods': {}, 'highest': None}
+        return {
+            'count': totals.count, 'total': totals.total,
+            'categories': {t.category_names[i]: amt for i, amt in enumerate(totals.category_totals) if amt > 0},
+            'payment_methods': {t.payment_method_names[i]: amt for i, amt in enumerate(totals.payment_totals) if amt > 0},
+            'highest': self._expense_json(totals.highest),
+        }
+
+    def _series_json(self, s: main.recurring.Series) -> dict:
+        t = self.tracker
+        return {
+            'description': s.description, 'amount': s.amount, 'cadence': s.cadence,
+            'category': t.category_names[s.category], 'payment_method': t.payment_method_names[s.payment_method],
+            'occurrences': len(s.expenses), 'last': main.calendar_day(s.last_date).text,
+        }
+
+    def _parse(self, row) -> main.Expense:
+        # Without a category, the one the rules or history suggest
+        return self.tracker._parse_import_row(row, "Miscellaneous", "Cash", self.tracker.suggest_category)
+
+    def _key(self, data) -> tuple:
+        key = data['key']
+        if not isinstance(key, list) or len(key) != 5:
+            raise ValueError("key must be the five-element list an expense response carries")
+        return tuple(key)
+
+    # --- Endpoints ---
+
+    async def list_expenses(self, query, data):
+        page = max(int(query.get('page', 1)), 1)
+        size = min(max(int(query.get('size', main.LIST_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+
+        def read():
+            rows = self.tracker.newest_expenses(size, (page - 1) * size)
+            return {'count': self.tracker.expense_count(), 'page': page,
+                    'expenses': [self._expense_json(e) for e in rows]}
+
+        return HTTPStatus.OK, await self._call(read)
+
+    async def search_expenses(self, query, data):
+        t = self.tracker
+        page = max(int(query.get('page', 1)), 1)
+        size = min(max(int(query.get('size', main.LIST_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        amounts = [float(query[k]) if k in query else None for k in ('min_amount', 'max_amount')]
+
+        def read():
+            results = t.search_expenses(
+                query.get('q', ""),
+                main.resolve_choice(query['category'], t.category_names, "category") if 'category' in query else None,
+                main.resolve_choice(query['payment_method'], t.payment_method_names, "payment method")
+                if 'payment_method' in query else None,
+                *amounts,
+                main.parse_date(query['start']) if 'start' in query else None,
+                main.parse_date(query['end']).replace(hour=23, minute=59, second=59) if 'end' in query else None,
+            )
+            return {'count': len(results), 'page': page,
+                    'expenses': [self._expense_json(e) for e in results[(page - 1) * size:page * size]]}
+
+        return HTTPStatus.OK, await self._call(read)
+
+    async def add_expense(self, query, data):
+        row = dict(data)
+        row.setdefault('date', datetime.now().strftime('%d-%m-%Y'))
+
+        def change():
+            expense = self._parse(row)
+            self.tracker._add(expense)
+            return self._expense_json(expense)
+
+        return HTTPStatus.CREATED, await self._write(change)
+
+    async def edit_expense(self, query, data):
+        key = self._key(data)
+
+        def change():
+            old = self.tracker.find_expense(key)
+            if old is None:
+                raise ApiError(HTTPStatus.NOT_FOUND, "no such expense")
+            row = {'amount': old.amount, 'description': old.description, 'category': old.category,
+                   'payment_method': old.payment_method, 'date': main.calendar_day(old.date).text}
+            row.update((k, v) for k, v in data.items() if k in row)
+            new = self._parse(row)
+            if 'date' not in data:
+                new.date = old.date
+            if not self.tracker._replace(old, new):
+                raise ApiError(HTTPStatus.CONFLICT, "the expense was changed by another process; fetch it again")
+            return self._expense_json(new)
+
+        return HTTPStatus.OK, await self._write(change)
+
+    async def delete_expense(self, query, data):
+        key = self._key(data)
+        if not await self._write(lambda: self.tracker._remove(main.Expense(*key))):
+            raise ApiError(HTTPStatus.NOT_FOUND, "no such expense")
+        return HTTPStatus.OK, {'deleted': list(key)}
+
+    async def month_report(self, query, data):
+        if 'month' in query:
+            year, month = main.parse_month(query['month'])
+        else:
+            year, month = datetime.now().year, datetime.now().month
+        budget = float(query['budget']) if 'budget' in query else None
+
+        def read():
+            result = {'month': f"{month:02d}-{year}"}
+            result.update(self._totals_json(self.tracker._month_totals(year, month)))
+            if budget is not None:
+                result['budget'] = {'budget': budget, 'remaining': budget - result['total'],
+                                    'percent_used': result['total'] / budget * 100 if budget else 0.0}
+                forecast = self.tracker.month_forecast(year, month)
+                result['forecast'] = {
+                    'projected': forecast.projected, 'recurring_due': forecast.recurring_due,
+                    'daily_rate': forecast.daily_rate, 'days_left': forecast.days_left,
+                    'upcoming': [dict(self._series_json(s), date=main.calendar_day(ts).text) for ts, s in forecast.upcoming],
+                }
+            return result
+
+        return HTTPStatus.OK, await self._call(read)
+
+    async def recurring_report(self, query, data):
+        def read():
+            return {'recurring': [dict(self._series_json(s), next_due=main.calendar_day(s.next_date).text)
+                                  for s in self.tracker.recurring_expenses()]}
+
+        return HTTPStatus.OK, await self._call(read)
+
+    async def range_report(self, query, data):
+        start, end = main.parse_date(query['start']), main.parse_date(query['end'])
+
+        def read():
+            totals = self.tracker._range_totals(start, end.replace(hour=23, minute=59, second=59))
+            return dict(self._totals_json(totals), start=start.strftime('%d-%m-%Y'), end=end.strftime('%d-%m-%Y'))
+
+        return HTTPStatus.OK, await self._call(read)
+
+    async def export(self, query, data):
+        t = self.tracker
+        fmt = data.get('format', "csv")
+        if fmt not in ("csv", "xlsx"):
+            raise ValueError("format must be csv or xlsx")
+        if fmt == "xlsx" and main._import_openpyxl() is None:
+            raise ApiError(HTTPStatus.NOT_IMPLEMENTED, "Excel export needs openpyxl: pip install openpyxl")
+        if 'month' in data:
+            year, month = main.parse_month(data['month'])
+            bounds = main._month_bounds(year, month)
+        else:
+            start = main.parse_date(data['start'])
+            end = main.parse_date(data['end']).replace(hour=23, minute=59, second=59)
+            bounds = main._inclusive_bounds(start, end)
+        # Copy the period's rows now; the export thread then never sees later changes
+        detached = await self._call(lambda: main._detached(t.category_names, t.payment_method_names,
+                                                           t._added_between(*bounds)))
+        if 'month' in data:
+            job = lambda: detached._export_month(year, month, fmt)
+        else:
+            job = lambda: detached._export_range(start, end, fmt)
+        exported = await asyncio.get_running_loop().run_in_executor(None, job)
+        if exported is None:
+            raise ApiError(HTTPStatus.NOT_FOUND, "no expenses in that period; no report generated")
+        path, totals = exported
+        return HTTPStatus.CREATED, await self._call(lambda: dict(self._totals_json(totals), file=path))
+
+
+def serve(tracker, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """Serve the tracker until interrupted"""
+    api = ApiServer(tracker)
+    try:
+        asyncio.run(api.run(host, port))
+    except KeyboardInterrupt:
+        print("\nServer stopped.")
+    finally:
+        api.close()
@@ -0,0 +1,352 @@
+"""SQLite storage engine: expenses, balances and categories in one local database file.
+
+Expenses are passed in and out as (amount, description, category, payment_method, date)
+tuples. Each row is one distinct expense; in_main and memory_seq record whether it is in
+the main list and where it sits in the recent-expenses memory (higher is newer)."""
+import json
+import sqlite3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS expenses (
+    id INTEGER PRIMARY KEY,
+    amount REAL NOT NULL,
+    description TEXT NOT NULL,
+    category INTEGER NOT NULL,
+    payment_method INTEGER NOT NULL,
+    date REAL NOT NULL,
+    in_main INTEGER NOT NULL DEFAULT 1,
+    memory_seq INTEGER
+);
+CREATE INDEX IF NOT EXISTS expenses_date ON expenses(date);
+CREATE INDEX IF NOT EXISTS expenses_category ON expenses(category);
+CREATE INDEX IF NOT EXISTS expenses_payment_method ON expenses(payment_method);
+CREATE INDEX IF NOT EXISTS expenses_memory ON expenses(memory_seq);
+CREATE INDEX IF NOT EXISTS expenses_amount ON expenses(amount);
+CREATE INDEX IF NOT EXISTS expenses_description ON expenses(description);
+-- Per (month, category, payment_method) sum, count and highest amount, kept current by the
+-- triggers below; month is year * 100 + month in local time.
+CREATE TABLE IF NOT EXISTS rollup (
+    month INTEGER NOT NULL,
+    category INTEGER NOT NULL,
+    payment_method INTEGER NOT NULL,
+    total REAL NOT NULL,
+    count INTEGER NOT NULL,
+    highest REAL,
+    PRIMARY KEY (month, category, payment_method)
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS rollup_insert AFTER INSERT ON expenses BEGIN
+    INSERT OR IGNORE INTO rollup VALUES (%(new_month)s, NEW.category, NEW.payment_method, 0, 0, NEW.amount);
+    %(roll_in)s;
+END;
+CREATE TRIGGER IF NOT EXISTS rollup_delete AFTER DELETE ON expenses BEGIN
+    %(roll_out)s;
+    DELETE FROM rollup WHERE %(old_bucket)s AND count = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS rollup_update AFTER UPDATE OF amount, category, payment_method, date ON expenses BEGIN
+    %(roll_out)s;
+    DELETE FROM rollup WHERE %(old_bucket)s AND count = 0;
+    INSERT OR IGNORE INTO rollup VALUES (%(new_month)s, NEW.category, NEW.payment_method, 0, 0, NEW.amount);
+    %(roll_in)s;
+END;
+CREATE TABLE IF NOT EXISTS balances (
+    kind TEXT PRIMARY KEY,
+    amount REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS balance_history (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    amount REAL NOT NULL,
+    date REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS categories (
+    position INTEGER PRIMARY KEY,
+    name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+FIELDS = "amount, description, category, payment_method, date"
+MONTH = "CAST(strftime('%Y%m', {0}.date, 'unixepoch', 'localtime') AS INTEGER)"
+# Timestamp of local midnight on the first of {0}.date's month, plus the given months
+MONTH_START = "CAST(strftime('%s', {0}.date, 'unixepoch', 'localtime', 'start of month', '+{1} months', 'utc') AS REAL)"
+SCHEMA = SCHEMA % {
+    'new_month': MONTH.format("NEW"),
+    'old_bucket': f"month = {MONTH.format('OLD')} AND category = OLD.category AND payment_method = OLD.payment_method",
+    'roll_in': ("UPDATE rollup SET total = total + NEW.amount, count = count + 1, highest = MAX(highest, NEW.amount) "
+                f"WHERE month = {MONTH.format('NEW')} AND category = NEW.category AND payment_method = NEW.payment_method"),
+    # Losing its highest expense, a bucket looks the next one up among the month's rows (the
+    # planner would otherwise pick the far less selective payment method index), so reports
+    # only ever read the rollup
+    'roll_out': ("UPDATE rollup SET total = total - OLD.amount, count = count - 1, "
+                 "highest = CASE WHEN OLD.amount >= highest THEN (SELECT MAX(amount) FROM expenses INDEXED BY expenses_date "
+                 f"WHERE date >= {MONTH_START.format('OLD', 0)} AND date < {MONTH_START.format('OLD', 1)} "
+                 "AND category = OLD.category AND payment_method = OLD.payment_method) ELSE highest END "
+                 f"WHERE month = {MONTH.format('OLD')} AND category = OLD.category AND payment_method = OLD.payment_method"),
+}
+MATCH = "amount = ? AND description = ? AND category = ? AND payment_method = ? AND date = ?"
+
+
+class SQLiteStorage:
+    def __init__(self, path, max_memory):
+        self.path = path
+        self.max_memory = max_memory
+        # Used by one thread at a time, but not always the one that opened it: the API server
+        # hands every tracker call to its own worker thread
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        if self.get_meta('rollup') is None:
+            self.rebuild_rollup()
+            self.set_meta('rollup', '1')
+
+    def close(self):
+        self.conn.close()
+
+    def version(self):
+        """Changes after any write: this connection's row changes, plus PRAGMA data_version for
+        commits made through other connections"""
+        return self.conn.total_changes, self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def get_meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    # --- Expense writes: one transaction each ---
+
+    def add(self, fields):
+        """Insert a new expense into the main list and the front of memory, trimming memory"""
+        with self.conn:
+            self.conn.execute(
+                f"INSERT INTO expenses ({FIELDS}, in_main, memory_seq) "
+                "VALUES (?, ?, ?, ?, ?, 1, (SELECT COALESCE(MAX(memory_seq), 0) + 1 FROM expenses))",
+                fields
+            )
+            self._trim_memory()
+
+    def insert_rows(self, rows):
+        """Bulk insert (amount, description, category, payment_method, date, in_main, memory_seq) rows"""
+        with self.conn:
+            self.conn.executemany(f"INSERT INTO expenses ({FIELDS}, in_main, memory_seq) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self._trim_memory()
+
+    def add_many(self, rows):
+        """add() for each of the given expense tuples in order, in one transaction"""
+        with self.conn:
+            base = self.conn.execute("SELECT COALESCE(MAX(memory_seq), 0) FROM expenses").fetchone()[0]
+            self.conn.executemany(
+                f"INSERT INTO expenses ({FIELDS}, in_main, memory_seq) VALUES (?, ?, ?, ?, ?, 1, ?)",
+                [tuple(row) + (base + i,) for i, row in enumerate(rows, 1)]
+            )
+            self._trim_memory()
+
+    def _trim_memory(self):
+        row = self.conn.execute(
+            "SELECT memory_seq FROM expenses WHERE memory_seq > 0 ORDER BY memory_seq DESC LIMIT 1 OFFSET ?",
+            (self.max_memory,)
+        ).fetchone()
+        if row is not None:
+            self._drop_memory(row[0])
+
+    def _drop_memory(self, through_seq):
+        """Take memory entries up to through_seq out of memory, deleting those not in the main list.
+        Both statements stay on the memory index rather than scanning the table."""
+        self.conn.execute("DELETE FROM expenses WHERE memory_seq > 0 AND memory_seq <= ? AND in_main = 0", (through_seq,))
+        self.conn.execute("UPDATE expenses SET memory_seq = NULL WHERE memory_seq > 0 AND memory_seq <= ?", (through_seq,))
+
+    def remove(self, key) -> bool:
+        with self.conn:
+            cur = self.conn.execute(f"DELETE FROM expenses WHERE id = (SELECT id FROM expenses WHERE {MATCH} LIMIT 1)", key)
+        return cur.rowcount > 0
+
+    def replace(self, old_key, new_fields) -> bool:
+        with self.conn:
+            cur = self.conn.execute(
+                "UPDATE expenses SET amount = ?, description = ?, category = ?, payment_method = ?, date = ? "
+                f"WHERE id = (SELECT id FROM expenses WHERE {MATCH} LIMIT 1)",
+                tuple(new_fields) + tuple(old_key)
+            )
+        return cur.rowcount > 0
+
+    def clear_memory(self):
+        with self.conn:
+            self._drop_memory(float('inf'))
+
+    def shift_dates(self, start_ts, stop_ts, delta) -> int:
+        """Move every expense dated start_ts <= date < stop_ts by delta seconds"""
+        with self.conn:
+            cur = self.conn.execute("UPDATE expenses SET date = date + ? WHERE date >= ? AND date < ?", (delta, start_ts, stop_ts))
+        return cur.rowcount
+
+    # --- Expense queries ---
+
+    def keys_between(self, start_ts, end_ts):
+        """Set of the expense tuples dated start_ts <= date <= end_ts"""
+        return set(self.conn.execute(f"SELECT {FIELDS} FROM expenses WHERE date >= ? AND date <= ?", (start_ts, end_ts)))
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM expenses").fetchone()[0]
+
+    def list_counts(self):
+        """(main list length, memory length), read from the memory index rather than a table scan"""
+        memory, memory_only = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(in_main = 0), 0) FROM expenses WHERE memory_seq > 0"
+        ).fetchone()
+        return self.count() - memory_only, memory
+
+    def main_total(self) -> float:
+        return self.conn.execute("SELECT COALESCE(SUM(amount), 0) FROM expenses WHERE in_main = 1").fetchone()[0]
+
+    def main_list(self, limit, offset=0):
+        """Main list entries in the order they were added, skipping `offset`"""
+        return self.conn.execute(
+            f"SELECT {FIELDS} FROM expenses WHERE in_main = 1 ORDER BY id LIMIT ? OFFSET ?", (limit, offset)
+        ).fetchall()
+
+    def memory_list(self, limit, offset=0):
+        """Memory entries newest first, skipping `offset`"""
+        return self.conn.execute(
+            f"SELECT {FIELDS} FROM expenses WHERE memory_seq IS NOT NULL ORDER BY memory_seq DESC LIMIT ? OFFSET ?",
+            (limit, offset)
+        ).fetchall()
+
+    def newest(self, offset, limit):
+        """Expenses newest first (latest added first among equal dates), skipping `offset`"""
+        return self.conn.execute(
+            f"SELECT {FIELDS} FROM expenses ORDER BY date DESC, id DESC LIMIT ? OFFSET ?", (limit, offset)
+        ).fetchall()
+
+    def between(self, start_ts, stop_ts):
+        """Expenses dated start_ts <= date < stop_ts, oldest first"""
+        return self.conn.execute(
+            f"SELECT {FIELDS} FROM expenses WHERE date >= ? AND date < ? ORDER BY date, id", (start_ts, stop_ts)
+        ).fetchall()
+
+    def added_between(self, start_ts, stop_ts):
+        """between(), in the order the expenses were added"""
+        return self.conn.execute(
+            f"SELECT {FIELDS} FROM expenses WHERE date >= ? AND date < ? ORDER BY id", (start_ts, stop_ts)
+        ).fetchall()
+
+    def iter_newest(self, start_ts, stop_ts):
+        """Cursor over (id, *fields) rows of the expenses dated start_ts <= date < stop_ts, newest
+        first (in the order they were added among equal dates); rows are fetched as it is iterated"""
+        return self.conn.execute(
+            f"SELECT id, {FIELDS} FROM expenses WHERE date >= ? AND date < ? ORDER BY date DESC, id", (start_ts, stop_ts)
+        )
+
+    def descriptions(self):
+        """Every distinct description"""
+        return [row[0] for row in self.conn.execute("SELECT DISTINCT description FROM expenses")]
+
+    def description_categories(self):
+        """(description, category, number of expenses) for every pairing of the two"""
+        return self.conn.execute("SELECT description, category, COUNT(*) FROM expenses GROUP BY description, category").fetchall()
+
+    def search(self, descriptions, category, payment_method, min_amount, max_amount, start_ts, stop_ts):
+        """Expenses dated start_ts <= date < stop_ts with one of the given descriptions (any, if
+        None) that pass each filter not None, newest first"""
+        where, params = ["date >= ? AND date < ?"], [start_ts, stop_ts]
+        if descriptions is not None:
+            # One parameter however many descriptions match, rather than one each
+            where.append("description IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(sorted(descriptions)))
+        for condition, value in (("category = ?", category), ("payment_method = ?", payment_method),
+                                 ("amount >= ?", min_amount), ("amount <= ?", max_amount)):
+            if value is not None:
+                where.append(condition)
+                params.append(value)
+        return self.conn.execute(
+            f"SELECT {FIELDS} FROM expenses WHERE {' AND '.join(where)} ORDER BY date DESC, id DESC", params
+        ).fetchall()
+
+    def rebuild_rollup(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM rollup")
+            self.conn.execute(
+                f"INSERT INTO rollup SELECT {MONTH.format('expenses')} AS m, category, payment_method, SUM(amount), COUNT(*), "
+                "MAX(amount) FROM expenses GROUP BY m, category, payment_method"
+            )
+
+    def month_totals(self, year, month, start_ts, stop_ts, categories, methods):
+        """totals() for the month that runs start_ts <= date < stop_ts, read from its rollup rows"""
+        key = year * 100 + month
+        buckets = self.conn.execute(
+            "SELECT category, payment_method, total, count, highest FROM rollup WHERE month = ?", (key,)
+        ).fetchall()
+        if not buckets:
+            return None
+        cat_totals = [0.0] * categories
+        pm_totals = [0.0] * methods
+        count = 0
+        highest = None
+        for category, payment_method, amount, n, top in buckets:
+            cat_totals[category] += amount
+            pm_totals[payment_method] += amount
+            count += n
+            highest = top if highest is None else max(highest, top)
+        row = self.conn.execute(
+            f"SELECT {FIELDS} FROM expenses WHERE date >= ? AND date < ? AND amount = ? ORDER BY id LIMIT 1",
+            (start_ts, stop_ts, highest)
+        ).fetchone()
+        return count, sum(cat_totals), cat_totals, pm_totals, row
+
+    def totals(self, start_ts, stop_ts, categories, methods):
+        """(count, total, category totals, payment method totals, highest expense) for expenses
+        dated start_ts <= date < stop_ts, or None if there are none; of equal highest expenses,
+        the one added first"""
+        groups = self.conn.execute(
+            "SELECT category, payment_method, SUM(amount), COUNT(*) FROM expenses "
+            "WHERE date >= ? AND date < ? GROUP BY category, payment_method",
+            (start_ts, stop_ts)
+        ).fetchall()
+        if not groups:
+            return None
+        cat_totals = [0.0] * categories
+        pm_totals = [0.0] * methods
+        count = 0
+        for category, payment_method, amount, n in groups:
+            cat_totals[category] += amount
+            pm_totals[payment_method] += amount
+            count += n
+        highest = self.conn.execute(
+            f"SELECT {FIELDS} FROM expenses WHERE date >= ? AND date < ? ORDER BY amount DESC, id LIMIT 1",
+            (start_ts, stop_ts)
+        ).fetchone()
+        return count, sum(cat_totals), cat_totals, pm_totals, highest
+
+    # --- Balances and categories: small, rewritten as a whole ---
+
+    def load_balance(self):
+        """{'bank_balance', 'cash_balance', 'bank_history', 'cash_history'}; histories are (amount, date) lists"""
+        data = {'bank_balance': 0.0, 'cash_balance': 0.0, 'bank_history': [], 'cash_history': []}
+        for kind, amount in self.conn.execute("SELECT kind, amount FROM balances"):
+            data[f'{kind}_balance'] = amount
+        for kind, amount, date in self.conn.execute("SELECT kind, amount, date FROM balance_history ORDER BY id"):
+            data[f'{kind}_history'].append((amount, date))
+        return data
+
+    def save_balance(self, bank_balance, cash_balance, bank_history, cash_history):
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO balances (kind, amount) VALUES (?, ?)",
+                                  [('bank', bank_balance), ('cash', cash_balance)])
+            self.conn.execute("DELETE FROM balance_history")
+            self.conn.executemany(
+                "INSERT INTO balance_history (kind, amount, date) VALUES (?, ?, ?)",
+                [('bank', a, d) for a, d in bank_history] + [('cash', a, d) for a, d in cash_history]
+            )
+
+    def load_categories(self):
+        return [name for (name,) in self.conn.execute("SELECT name FROM categories ORDER BY position")]
+
+    def save_categories(self, names):
+        with self.conn:
+            self.conn.execute("DELETE FROM categories")
+            self.conn.executemany("INSERT INTO categories (position, name) VALUES (?, ?)", list(enumerate(names)))